@@ -2,17 +2,33 @@ import asyncio
 import argparse
 import os
 import math
-from bleak import BleakClient, BleakScanner
-from bleak.exc import BleakError
-from PIL import Image, ImageDraw, ImageFont
+import time
+import json
+import functools
+import itertools
+import contextlib
+import hashlib
+import tempfile
+import string
+import csv
+import re
+from collections import deque, namedtuple
 import sys # For exit
+# bleak, Pillow and matplotlib are imported where they are first needed, so actions that don't
+# use them (argument errors, --list-fonts from the font index, --submit) start quickly.
 
-try:
-    from matplotlib import font_manager
-    MATPLOTLIB_AVAILABLE = True
-except ImportError:
-    MATPLOTLIB_AVAILABLE = False
-    font_manager = None # Ensure font_manager exists even if import fails
+_font_manager = False # matplotlib.font_manager once imported, None if matplotlib is not installed
+
+def get_font_manager():
+    """Imports matplotlib.font_manager on first use; returns None if matplotlib is not installed."""
+    global _font_manager
+    if _font_manager is False:
+        try:
+            from matplotlib import font_manager
+            _font_manager = font_manager
+        except ImportError:
+            _font_manager = None
+    return _font_manager
 
 # --- Constants ---
 DEFAULT_ADDRESS = "48:0F:57:00:00:00" # Default printer address
@@ -23,8 +39,23 @@ DATA_WRITE_UUID = "0000ae03-0000-1000-8000-00805f9b34fb"     # Write characteris
 PRINTER_WIDTH_PIXELS = 384
 PRINTER_WIDTH_BYTES = PRINTER_WIDTH_PIXELS // 8
 MAX_FEED_CHUNK_HEIGHT = 256 # Max lines per single paper feed command
+MAX_PRINT_HEIGHT = 65535 # Max rows in one A9 print request (2-byte height field)
+STREAM_BAND_HEIGHT = 128 # Rows read, scaled, dithered and packed at a time by --stream
+TEXT_STREAM_BAND_LINES = 16 # Wrapped text lines per band (and print session) for --text-file
+DEFAULT_PREFETCH = 2 # Jobs prepared ahead of the one printing
+IMAGE_PREPARE_AHEAD = 2 # Image files in flight per worker process while preparing a folder
 SUPPORTED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
-DELAY_BETWEEN_PRINTS = 1.0 # Seconds (Applied between separate print jobs AND feed chunks)
+DELAY_BETWEEN_PRINTS = 1.0 # Seconds between separate print jobs when the printer didn't confirm the previous one (AA)
+DISCONNECT_GRACE = 0.5 # Seconds to wait before disconnecting when a feed's AA never arrived
+AA_MISSING_GRACE = 0.5 # Seconds to wait at the end of a print job whose last AA never arrived
+DEFAULT_BATCH_GAP = 0 # Blank rows between jobs merged by --batch
+
+# Data Transfer Constants (AE03)
+DEFAULT_DATA_CHUNK_SIZE = 20 # Bytes per write when the negotiated MTU is unknown (23 byte ATT MTU - 3)
+MAX_DATA_CHUNK_SIZE = 244 # Upper bound per write (247 byte ATT MTU - 3)
+TRANSFER_WINDOW = 4 # Max write-without-response operations in flight at once
+TRANSFER_BACKOFF_DELAY = 0.05 # Seconds to back off after a rejected write (scaled by retry count)
+TRANSFER_MAX_RETRIES = 10 # Give up after this many congestion back-offs in one transfer
 
 # Test Print Constants
 TEST_IMAGE_FOLDER = "test_print_images" # Folder to scan for --test-print images
@@ -41,141 +72,217 @@ TEST_TEXT_JOBS = [
 DEFAULT_FONT_NAME = "Arial" # Keep this as a fallback name
 DEFAULT_FONT_SIZE = 24
 
-def load_font(font_name, font_size):
-    """Loads a font by name and size using matplotlib.font_manager, falling back to defaults."""
-    font_path = None
+# Font index: family name -> font files, built once from matplotlib and stored on disk
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'mxw01print')
+FONT_INDEX_PATH = os.path.join(CACHE_DIR, 'font_index.json')
+FONT_INDEX_VERSION = 1
+FONT_CACHE_SIZE = 32 # Loaded ImageFont objects kept in memory, keyed by (path, size)
+# Standard font locations watched for changes (with all their subfolders) in addition to the folders of indexed fonts
+SYSTEM_FONT_DIRS = [
+    '/usr/share/fonts', '/usr/local/share/fonts', os.path.expanduser('~/.fonts'), os.path.expanduser('~/.local/share/fonts'),
+    '/Library/Fonts', '/System/Library/Fonts', os.path.expanduser('~/Library/Fonts'),
+    os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+]
+if os.environ.get('LOCALAPPDATA'): # Per-user fonts on Windows; without the variable the path would be relative to the cwd
+    SYSTEM_FONT_DIRS.append(os.path.join(os.environ['LOCALAPPDATA'], 'Microsoft', 'Windows', 'Fonts'))
+# Filename substrings indicating a non-regular style
+STYLE_INDICATORS_IN_FILENAME = [
+    'bd', 'bold', 'bld',
+    'i', 'italic', 'obl', 'oblique',
+    'blk', 'black',
+    'narrow', 'n',
+]
+_font_index = None # In-process copy of the on-disk index
+
+def _font_dir_mtimes(dirs):
+    """Returns {directory: mtime} for the given directories that exist."""
+    mtimes = {}
+    for d in dirs:
+        try: mtimes[d] = os.stat(d).st_mtime
+        except OSError: pass
+    return mtimes
+
+def _system_font_dirs():
+    """Returns the existing SYSTEM_FONT_DIRS and all folders below them (walked only when the index is built).
+
+    Every folder of the tree is watched, so adding or removing a subfolder anywhere changes the
+    mtime of a watched folder and checking the index needs no walk, only a stat per folder.
+    """
+    dirs = set()
+    for root in SYSTEM_FONT_DIRS:
+        for path, _, _ in os.walk(root): dirs.add(path)
+    return dirs
+
+def _rescan_matplotlib_fonts(font_manager):
+    """Makes matplotlib scan the font folders again; its own cached font list doesn't notice new fonts."""
+    load = getattr(font_manager, '_load_fontmanager', None)
+    if load is None: return
+    try: manager = load(try_read_cache=False)
+    except Exception as e: print(f"    Info: Could not rescan fonts with matplotlib: {e}"); return
+    font_manager.fontManager = manager
+    font_manager.findfont = manager.findfont
+
+def _save_font_index(index):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp') # Unique, so concurrent writers can't interleave
+        with os.fdopen(fd, 'w') as f: json.dump(index, f)
+        os.replace(tmp_path, FONT_INDEX_PATH)
+    except OSError as e:
+        print(f"    Info: Could not write font index '{FONT_INDEX_PATH}': {e}")
+
+def _build_font_index():
+    """Rescans the system fonts through matplotlib and returns a fresh index (None without matplotlib)."""
+    font_manager = get_font_manager()
+    if font_manager is None: return None
+    _rescan_matplotlib_fonts(font_manager)
+    fonts = {}
+    try:
+        for f in font_manager.fontManager.ttflist:
+            fonts.setdefault(f.name, []).append([f.fname, f.style, f.weight])
+    except Exception as e:
+        print(f"    Info: Error during font list iteration while building font index: {e}")
+        return None
+    dirs = {os.path.dirname(entry[0]) for entries in fonts.values() for entry in entries}
+    dirs.update(_system_font_dirs())
+    index = {"version": FONT_INDEX_VERSION, "dirs": _font_dir_mtimes(sorted(dirs)), "fonts": fonts, "resolved": {}}
+    _save_font_index(index)
+    return index
+
+def _font_index_is_current(index):
+    """An index is current while none of the watched font folders changed (fonts or subfolders added/removed)."""
+    if not isinstance(index, dict) or index.get("version") != FONT_INDEX_VERSION: return False
+    watched = index.get("dirs", {})
+    return _font_dir_mtimes(set(watched) | set(SYSTEM_FONT_DIRS)) == watched
+
+def get_font_index():
+    """Returns the font index, loading it from disk or rebuilding it when font folders changed."""
+    global _font_index
+    if _font_index is not None: return _font_index
+    try:
+        with open(FONT_INDEX_PATH) as f: index = json.load(f)
+        if _font_index_is_current(index): _font_index = index; return index
+    except (OSError, ValueError): pass
+    _font_index = _build_font_index()
+    return _font_index
+
+def _select_plain_font(font_name, paths):
+    """Strategy 1: Prefer a "plain" filename among the paths matching a family name."""
+    if not paths: return None
+    for path in paths:
+        base_name = os.path.basename(path).lower()
+        name_part, _ = os.path.splitext(base_name)
+        # Check if the filename part contains any style indicator
+        is_plain = True
+        # Exclude filenames exactly matching '<fontname>n.ttf' like 'arialn.ttf'
+        # unless the indicator list specifically contains just 'n'. This logic is tricky.
+        # A more robust approach might involve more complex regex or rules.
+        if name_part == font_name.lower() + 'n' and 'n' in STYLE_INDICATORS_IN_FILENAME:
+            is_plain = False # Treat 'arialn' as non-plain if 'n' is an indicator
+        # Check other indicators, removing the base font name first
+        elif any(indicator in name_part.replace(font_name.lower(), '') for indicator in STYLE_INDICATORS_IN_FILENAME if indicator != 'n'):
+            is_plain = False
+        if is_plain: return path
+    return paths[0] # Fallback to the first match
+
+def _findfont(font_name, fallback_to_default):
+    """Strategy 2: Ask matplotlib's findfont (only used when the index has no entry)."""
+    font_manager = get_font_manager()
+    if font_manager is None: return None
+    try:
+        if not fallback_to_default and not any(font_name.lower().endswith(ext) for ext in ('.ttf', '.otf')):
+            for ext in ('.ttf', '.otf'):
+                try: return font_manager.findfont(font_name + ext, fallback_to_default=False)
+                except Exception: pass
+        return font_manager.findfont(font_name, fallback_to_default=fallback_to_default)
+    except Exception as e:
+        if fallback_to_default: print(f"    Warning: Error finding default font '{font_name}' via matplotlib: {e}")
+        return None
 
-    if MATPLOTLIB_AVAILABLE:
-        # Collect matching fonts first
-        matching_fonts = []
-        try:
-            for f in font_manager.fontManager.ttflist:
-                if f.name == font_name:
-                    matching_fonts.append(f)
-        except Exception as e:
-            print(f"    Info: Error during font list iteration while collecting matches: {e}")
-            matching_fonts = [] # Ensure it's empty on error
-        
-        # Strategy 1: Prefer "plain" filename among matches
-        try:
-            plain_font_path = None
-            first_match_path = None
-            
-            # Filename substrings indicating a non-regular style
-            style_indicators_in_filename = [
-                'bd', 'bold', 'bld',
-                'i', 'italic', 'obl', 'oblique',
-                'blk', 'black',
-                'narrow', 'n',
-            ]
-            
-            if matching_fonts:
-                first_match_path = matching_fonts[0].fname # Fallback to the first match
-                for f in matching_fonts:
-                    base_name = os.path.basename(f.fname).lower()
-                    name_part, _ = os.path.splitext(base_name)
-                    # Check if the filename part contains any style indicator
-                    is_plain = True
-                    # Exclude filenames exactly matching '<fontname>n.ttf' like 'arialn.ttf'
-                    # unless the indicator list specifically contains just 'n'. This logic is tricky.
-                    # A more robust approach might involve more complex regex or rules.
-                    if name_part == font_name.lower() + 'n' and 'n' in style_indicators_in_filename:
-                        is_plain = False # Treat 'arialn' as non-plain if 'n' is an indicator
-                    # Check other indicators, removing the base font name first
-                    elif any(indicator in name_part.replace(font_name.lower(), '') for indicator in style_indicators_in_filename if indicator != 'n'):
-                        is_plain = False
-                        
-                    if is_plain:
-                        plain_font_path = f.fname
-                        # Keep a quiet confirmation for debugging if needed later
-                        # print(f"    Selected plain filename path: {plain_font_path} (Filename: {base_name})")
-                        break
-                        
-            if plain_font_path:
-                font_path = plain_font_path
-            elif first_match_path:
-                # print(f"    Warning: No plain filename found. Falling back to first match: {first_match_path}")
-                font_path = first_match_path
-            
-        except Exception as e:
-             print(f"    Info: Error during font selection based on filename: {e}")
-             font_path = None
+def resolve_font_path(font_name, fallback_to_default=False):
+    """Resolves a font family name to a file path using the persistent font index.
+
+    Lookups (including misses) are remembered in the index, so matplotlib is only consulted
+    the first time a name is seen after the font folders change. The file is only rewritten
+    for answers that needed matplotlib; names found among the indexed families are cheap to redo.
+    """
+    index = get_font_index()
+    if index is None: return None
+    key = f"{font_name}|default" if fallback_to_default else font_name
+    resolved = index["resolved"]
+    if key in resolved: return resolved[key]
+    entries = index["fonts"].get(font_name, [])
+    font_path = _select_plain_font(font_name, [entry[0] for entry in entries])
+    if font_path: resolved[key] = font_path
+    else:
+        font_path = resolved[key] = _findfont(font_name, fallback_to_default)
+        _save_font_index(index)
+    return font_path
 
-        # Strategy 2: If not found via iteration/filename check, try findfont
-        if not font_path:
-            try:
-                common_extensions = ['.ttf', '.otf']
-                font_path_findfont = None
-                if not any(font_name.lower().endswith(ext) for ext in common_extensions):
-                    for ext in common_extensions:
-                        try:
-                            font_path_findfont = font_manager.findfont(font_name + ext, fallback_to_default=False)
-                            if font_path_findfont: break
-                        except Exception: pass
-                if not font_path_findfont:
-                     font_path_findfont = font_manager.findfont(font_name, fallback_to_default=False)
-
-                if font_path_findfont:
-                    font_path = font_path_findfont
-                    # print(f"    Found font path via findfont: {font_path}")
-
-            except Exception as e:
-                # print(f"    Info: Matplotlib findfont couldn't find or parse font '{font_name}'. Error: {e}")
-                font_path = None
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def _load_truetype(font_path, font_size):
+    from PIL import ImageFont
+    return ImageFont.truetype(font_path, font_size)
+
+def load_font(font_name, font_size):
+    """Loads a font by name and size using the font index, falling back to defaults."""
+    from PIL import ImageFont
+    font_path = resolve_font_path(font_name)
+    index_available = get_font_index() is not None
 
     # --- Loading Attempt ---
     if font_path:
         try:
-            # print(f"--> Attempting to load font: '{font_name}' (Size: {font_size}) from path: {font_path}")
-            return ImageFont.truetype(font_path, font_size)
+            return _load_truetype(font_path, font_size)
         except IOError as e:
             print(f"    Warning: Error loading font file '{font_path}'. {e}. Using default.")
     else:
-        if MATPLOTLIB_AVAILABLE: # Only print this if matplotlib was actually tried
+        if index_available: # Only print this if matplotlib was actually tried
              print(f"    Info: Font '{font_name}' not found via matplotlib. Proceeding to default '{DEFAULT_FONT_NAME}'.")
 
     # --- Fallback Logic ---
-    default_font_path = None
-    if MATPLOTLIB_AVAILABLE:
-        try:
-            # print(f"--> Searching for default font '{DEFAULT_FONT_NAME}' via matplotlib...")
-            default_font_path = font_manager.findfont(DEFAULT_FONT_NAME, fallback_to_default=True)
-            # print(f"--> Matplotlib found default font path: {default_font_path}")
-        except Exception as e:
-            print(f"    Warning: Error finding default font '{DEFAULT_FONT_NAME}' via matplotlib: {e}")
-            default_font_path = None
-
+    default_font_path = resolve_font_path(DEFAULT_FONT_NAME, fallback_to_default=True)
     if default_font_path:
         try:
-            # print(f"--> Attempting to load DEFAULT font from path: {default_font_path} (Size: {DEFAULT_FONT_SIZE})")
-            return ImageFont.truetype(default_font_path, DEFAULT_FONT_SIZE)
+            return _load_truetype(default_font_path, DEFAULT_FONT_SIZE)
         except IOError as e:
              print(f"    Warning: Error loading default font file '{default_font_path}'. {e}. Using PIL default.")
     else:
-        if MATPLOTLIB_AVAILABLE: # Only print if default search via matplotlib failed
+        if index_available: # Only print if default search via matplotlib failed
              print(f"    Info: Default font '{DEFAULT_FONT_NAME}' not found via matplotlib path. Using PIL default.")
 
     # Ultimate fallback: PIL's built-in default font
     try:
-        # print(f"--> Attempting to load PIL built-in default font.")
         return ImageFont.load_default()
     except IOError:
         print("    ERROR: Could not load ANY font! Text printing will likely fail.")
         return None
 
 # --- CRC Calculation (Standard CRC-8/Dallas Maxim) ---
+def _build_crc8_table():
+    """Precomputes the CRC-8 (polynomial 0x07) value for every possible byte."""
+    table = []
+    for value in range(256):
+        crc = value
+        for _ in range(8):
+            if crc & 0x80: crc = (crc << 1) ^ 0x07 # Polynomial 0x07
+            else: crc <<= 1
+            crc &= 0xFF # Ensure it stays within 8 bits
+        table.append(crc)
+    return tuple(table)
+
+CRC8_TABLE = _build_crc8_table()
+
 def crc8_update(crc, data_byte):
-    crc ^= data_byte
-    for _ in range(8):
-        if crc & 0x80: crc = (crc << 1) ^ 0x07 # Polynomial 0x07
-        else: crc <<= 1
-        crc &= 0xFF # Ensure it stays within 8 bits
-    return crc
+    return CRC8_TABLE[crc ^ data_byte]
+
+def calculate_crc8(data, crc=0x00):
+    """Calculates the CRC-8 checksum for the given bytes, bytearray or memoryview.
 
-def calculate_crc8(data):
-    """Calculates the CRC-8 checksum for the given data bytes."""
-    crc = 0x00
-    for byte in data: crc = crc8_update(crc, byte)
+    Pass a previous result as crc to continue a checksum across several buffers.
+    """
+    table = CRC8_TABLE
+    for byte in memoryview(data).cast('B'): crc = table[crc ^ byte]
     return crc
 # ----------------------
 
@@ -190,11 +297,145 @@ def create_command_simple(command_id, data):
     """Creates a command packet without CRC (uses 0x00 placeholders)."""
     data_length_le = len(data).to_bytes(2, byteorder='little')
     return bytes([0x22, 0x21, command_id, 0x00]) + data_length_le + data + bytes([0x00, 0x00])
+
+# Constant frames, built once and shared by every print job and feed chunk
+CMD_SETUP_B1 = create_command_with_crc(0xB1, bytes([0x00])) # Start print setup?
+CMD_SETUP_A2 = create_command_with_crc(0xA2, bytes([0x5D])) # Unknown setup command (sent twice per job)
+CMD_STATUS_A1 = create_command_with_crc(0xA1, bytes([0x00])) # Check printer status?
+CMD_END_PRINT_AD = create_command_simple(0xAD, bytes([0x00])) # Signals the end of the print data
+SETUP_SEQUENCE = (CMD_SETUP_B1, CMD_SETUP_A2, CMD_STATUS_A1)
+
+_A9_FRAME_PREFIX = bytes([0x22, 0x21, 0xA9, 0x00, 0x04, 0x00])
+_A9_FRAME_SUFFIX = PRINTER_WIDTH_BYTES.to_bytes(2, 'little') + bytes([0x00, 0x00])
+
+def create_print_request(height):
+    """Builds the A9 frame declaring the print dimensions (height, width_bytes)."""
+    return _A9_FRAME_PREFIX + height.to_bytes(2, 'little') + _A9_FRAME_SUFFIX
+# ----------------------------------
+
+# --- Dithering ---
+DITHER_MODES = ('floyd-steinberg', 'atkinson', 'bayer', 'threshold')
+DEFAULT_DITHER = 'floyd-steinberg'
+DEFAULT_THRESHOLD = 128 # Gray level (0-255) from which --dither threshold prints white
+DITHER_BAND_HEIGHT = 256 # Rows dithered at a time by dither_image
+# 8x8 ordered-dither (Bayer) index matrix; cell values 0-63 are spread evenly over the gray levels
+BAYER_MATRIX = [
+    [0, 32, 8, 40, 2, 34, 10, 42], [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38], [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41], [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37], [63, 31, 55, 23, 61, 29, 53, 21],
+]
+_WHITE_IF_NONZERO = [0] + [255] * 255 # point() table: any value above 0 becomes a white pixel
+
+@functools.lru_cache(maxsize=4)
+def _bayer_rows(width):
+    """The Bayer thresholds (4*cell+2, so 2-254) as one row of bytes per matrix row, tiled to width."""
+    return [bytes(4 * row[x % 8] + 2 for x in range(width)) for row in BAYER_MATRIX]
+
+class Ditherer:
+    """Dithers consecutive row bands of one grayscale image to 1-bit, keeping state across bands.
+
+    Bands are passed top to bottom as 'L' images of the same width. Floyd-Steinberg and Atkinson
+    carry their diffused error over band edges and the Bayer pattern stays aligned, so the result
+    doesn't depend on the band height. Floyd-Steinberg follows Pillow's convert('1') exactly, so
+    streamed bands match dither_image() on the whole image.
+    """
+    def __init__(self, mode=DEFAULT_DITHER, threshold=DEFAULT_THRESHOLD):
+        if mode not in DITHER_MODES: raise ValueError(f"Unknown dither mode '{mode}'")
+        self.mode = mode
+        self.threshold = threshold
+        self.row = 0 # Rows dithered so far (Bayer phase)
+        self._errors = None # Error diffused into the next row(s), carried across bands
+
+    def __call__(self, band):
+        from PIL import Image
+        if band.mode != 'L': band = band.convert('L')
+        width, height = band.size
+        if self.mode == 'floyd-steinberg':
+            out = Image.frombytes('L', (width, height), self._floyd_steinberg(band.tobytes(), width, height)).point(_WHITE_IF_NONZERO, '1')
+        elif self.mode == 'threshold':
+            out = band.point([255 if v >= self.threshold else 0 for v in range(256)], '1')
+        elif self.mode == 'bayer':
+            from PIL import ImageChops
+            rows = _bayer_rows(width)
+            thresholds = Image.frombytes('L', (width, height), b"".join(rows[(self.row + y) % 8] for y in range(height)))
+            # subtract() clips at 0, so only pixels brighter than their threshold stay above 0
+            out = ImageChops.subtract(band, thresholds).point(_WHITE_IF_NONZERO, '1')
+        else:
+            out = Image.frombytes('L', (width, height), self._atkinson(band.tobytes(), width, height)).point(_WHITE_IF_NONZERO, '1')
+        self.row += height
+        return out
+
+    def _floyd_steinberg(self, pixels, width, height):
+        """Floyd-Steinberg error diffusion with the integer arithmetic of Pillow's convert('1')."""
+        if self._errors is None: self._errors = [0] * (width + 1)
+        errors = self._errors # errors[x + 1] holds the error sixteenths diffused into column x
+        out = bytearray(width * height)
+        for y in range(height):
+            base = y * width
+            l = l0 = l1 = 0
+            for x in range(width):
+                carried = l + errors[x + 1]
+                l = pixels[base + x] + (carried // 16 if carried >= 0 else -(-carried // 16)) # C division truncates
+                l = 0 if l < 0 else 255 if l > 255 else l
+                if l > 128: out[base + x] = 255; l -= 255
+                # Running sums spread the error 7/16 right, 3/16 down-left, 5/16 down and 1/16 down-right
+                l2 = l; d2 = l + l
+                l += d2
+                errors[x] = l + l0
+                l += d2
+                l0 = l + l1
+                l1 = l2
+                l += d2
+            errors[width] = l0
+        return bytes(out)
+
+    def _atkinson(self, pixels, width, height):
+        """Atkinson error diffusion: 6/8 of each pixel's error goes to six neighbours, the rest is dropped."""
+        if self._errors is None: self._errors = ([0] * (width + 3), [0] * (width + 3))
+        cur, below = self._errors # Index x + 1 holds column x, so x - 1 and x + 2 stay in range
+        out = bytearray(width * height)
+        for y in range(height):
+            after = [0] * (width + 3)
+            base = y * width
+            for x in range(width):
+                v = pixels[base + x] + cur[x + 1]
+                if v >= 128: out[base + x] = 255; err = -((255 - v) >> 3)
+                else: err = v >> 3
+                if err:
+                    cur[x + 2] += err; cur[x + 3] += err
+                    below[x] += err; below[x + 1] += err; below[x + 2] += err
+                    after[x + 1] += err
+            cur, below = below, after
+        self._errors = (cur, below)
+        return bytes(out)
+
+def dither_image(img, mode=DEFAULT_DITHER, threshold=DEFAULT_THRESHOLD):
+    """Converts a PIL image to 1-bit with the given dither mode, DITHER_BAND_HEIGHT rows at a time."""
+    if mode == 'floyd-steinberg': return img.convert('1') # Pillow's C implementation, whole image in one pass
+    from PIL import Image
+    gray = img if img.mode == 'L' else img.convert('L')
+    out = Image.new('1', gray.size)
+    ditherer = Ditherer(mode, threshold)
+    for y in range(0, gray.height, DITHER_BAND_HEIGHT):
+        out.paste(ditherer(gray.crop((0, y, gray.width, min(y + DITHER_BAND_HEIGHT, gray.height)))), (0, y))
+    return out
 # ----------------------------------
 
 # --- Image Loading and Preparation ---
-def prepare_image_for_print(image_path, target_width):
-    """Loads, resizes/pads, and converts an image to 1-bit format for printing."""
+# Decode presets: (supersampling kept for the final resize, resampling filter of that resize)
+DECODE_PRESETS = {'fast': (1, 'BILINEAR'), 'quality': (2, 'LANCZOS')}
+DEFAULT_DECODE = 'quality'
+
+def prepare_image_for_print(image_path, target_width, dither=DEFAULT_DITHER, threshold=DEFAULT_THRESHOLD, decode=DEFAULT_DECODE):
+    """Loads, resizes/pads, and converts an image to 1-bit format for printing.
+
+    Wide images are scaled down in grayscale: JPEGs decode directly at a reduced scale (draft),
+    other formats are converted to grayscale first, then an integer reduce() does the bulk of
+    the downscaling and a final resize hits the exact width. The decode preset sets how much
+    resolution is kept for that last step and which filter it uses.
+    """
+    from PIL import Image
     try:
         img = Image.open(image_path)
     except FileNotFoundError:
@@ -213,115 +454,768 @@ def prepare_image_for_print(image_path, target_width):
         img = img_padded_width
     elif img.width > target_width:
         print(f"Resizing '{os.path.basename(image_path)}' width ({img.width}px -> {target_width}px)")
+        supersample, resample = DECODE_PRESETS[decode]
         ratio = target_width / img.width
         new_height = int(img.height * ratio)
-        img = img.resize((target_width, new_height))
+        img.draft('L', (target_width * supersample, new_height * supersample)) # No-op for non-JPEG files
+        img = img.convert('L')
+        factor = img.width // (target_width * supersample)
+        if factor >= 2: img = img.reduce(factor)
+        if img.size != (target_width, new_height): img = img.resize((target_width, new_height), getattr(Image.Resampling, resample))
 
-    # Convert to 1-bit black and white using default dithering
-    img_bw = img.convert('1')
+    # Convert to 1-bit black and white with the selected dithering
+    img_bw = dither_image(img, dither, threshold)
 
     return img_bw
+
+# A source image printed band by band (--stream) instead of being prepared as a whole
+StreamImage = namedtuple('StreamImage', ['path', 'target_width', 'upside_down', 'dither', 'threshold', 'decode'], defaults=(DEFAULT_DITHER, DEFAULT_THRESHOLD, DEFAULT_DECODE))
+
+def stream_image_height(source):
+    """Returns the printed height of a StreamImage, reading only the image header."""
+    from PIL import Image
+    with Image.open(source.path) as img:
+        width, height = img.size
+    if width > source.target_width: return int(height * (source.target_width / width))
+    return height
+
+def iter_stream_bands(source, band_height=STREAM_BAND_HEIGHT):
+    """Yields a StreamImage as packed printer rows, one band of at most band_height rows at a time.
+
+    Each band is scaled (or padded) to the target width, dithered to 1-bit and packed on its own,
+    so only the source image and one band are held in memory. JPEGs are decoded at a reduced
+    scale as in prepare_image_for_print. Upside-down bands are produced bottom first and rotated
+    individually before dithering, so the ditherer sees them in print order.
+    """
+    from PIL import Image
+    target_width = source.target_width
+    ditherer = Ditherer(source.dither, source.threshold)
+    supersample, resample = DECODE_PRESETS[source.decode]
+    with Image.open(source.path) as img:
+        width, height = img.size
+        out_height = stream_image_height(source)
+        if width > target_width:
+            img.draft('L', (target_width * supersample, out_height * supersample)) # JPEGs decode smaller and in grayscale
+            width, height = img.size
+        scale = height / out_height if width > target_width and out_height else 1.0
+        starts = list(range(0, out_height, band_height))
+        if source.upside_down: starts.reverse()
+        for y0 in starts:
+            y1 = min(y0 + band_height, out_height)
+            if width > target_width:
+                box = (0, y0 * scale, width, min(y1 * scale, height))
+                band = img.resize((target_width, y1 - y0), getattr(Image.Resampling, resample), box=box)
+            elif width < target_width:
+                band = Image.new('L', (target_width, y1 - y0), color=255) # White background
+                band.paste(img.crop((0, y0, width, y1)).convert('L'), ((target_width - width) // 2, 0))
+            else:
+                band = img.crop((0, y0, width, y1))
+            if source.upside_down: band = band.rotate(180)
+            yield process_image(ditherer(band))
+
+def stream_image_to_bitmap(source):
+    """Assembles a StreamImage into a single 1-bit image (used by --debug-save)."""
+    data = b"".join(iter_stream_bands(source))
+    return packed_to_image(data, len(data) // PRINTER_WIDTH_BYTES)
 # -------------------------------------------------
 
 # --- Text Rendering ---
-def create_text_bitmap(text, font, width, alignment='left'):
-    """Renders multiline text onto a 1-bit bitmap with basic word wrapping and alignment."""
-    lines = []
-    paragraphs = text.split('\n')
-
-    def get_text_width(txt):
-        """Helper to get text width, handling font method differences."""
-        if not txt: return 0 # Handle empty strings
-        try: return font.getlength(txt)
-        except AttributeError: return font.getsize(txt)[0]
+def get_text_width(font, txt):
+    """Helper to get text width, handling font method differences."""
+    if not txt: return 0 # Handle empty strings
+    try: return font.getlength(txt)
+    except AttributeError: return font.getsize(txt)[0]
+
+def _split_long_word(word, measure, width):
+    """Splits a word wider than `width` into [(piece, piece_width)] that each fit."""
+    pieces, start, piece_width = [], 0, 0
+    for i, char in enumerate(word):
+        char_width = measure(char)
+        if i > start and piece_width + char_width > width:
+            pieces.append((word[start:i], piece_width))
+            start, piece_width = i, 0
+        piece_width += char_width
+    pieces.append((word[start:], piece_width))
+    return pieces
+
+def wrap_text(text, font, width, atlas=None):
+    """Word-wraps text to `width` pixels and returns [(line, line_width)].
+
+    Each distinct word and the space are measured once and lines are broken from running widths,
+    so the cost grows linearly with the text. Words wider than the paper are split across lines.
+    With a GlyphAtlas, widths are measured the way the atlas draws.
+    """
+    widths = {}
+    def measure(txt):
+        txt_width = widths.get(txt)
+        if txt_width is None: txt_width = widths[txt] = atlas.width(txt) if atlas else get_text_width(font, txt)
+        return txt_width
+    space_width = measure(' ')
 
-    # Simple word wrapping (same as before)
-    for paragraph in paragraphs:
+    lines = []
+    for paragraph in text.split('\n'):
         if not paragraph:
-            lines.append("")
+            lines.append(("", 0))
             continue
-        words = paragraph.split(' ')
-        current_line = ""
-        for i, word in enumerate(words):
-            test_line = current_line + (" " if current_line else "") + word
-            line_width = get_text_width(test_line)
-            if line_width <= width:
-                current_line = test_line
-            else:
-                if current_line: lines.append(current_line)
-                word_width = get_text_width(word)
-                current_line = word
-        if current_line: lines.append(current_line)
-
-    num_lines = len(lines)
-    if num_lines == 0: return Image.new('1', (width, 1), color=1)
+        words, line_width = [], 0
+        for word in paragraph.split(' '):
+            word_width = measure(word)
+            pieces = _split_long_word(word, measure, width) if word_width > width else [(word, word_width)]
+            for piece, piece_width in pieces:
+                if not words:
+                    if piece: words, line_width = [piece], piece_width # Leading spaces are dropped
+                elif line_width + space_width + piece_width <= width:
+                    words.append(piece); line_width += space_width + piece_width
+                else:
+                    lines.append((' '.join(words), line_width))
+                    words, line_width = ([piece], piece_width) if piece else ([], 0)
+        if words: lines.append((' '.join(words), line_width))
+    return lines
 
-    # Calculate line height and total text height (same as before)
+def text_line_metrics(font):
+    """Returns (line_height, interline_spacing) for a font."""
     try:
         ascent, descent = font.getmetrics()
-        line_height = ascent + descent
-        interline_spacing = 4
-        line_step = line_height + interline_spacing
+        return ascent + descent, 4
     except AttributeError:
         _, line_height = font.getsize('A')
-        interline_spacing = 2
-        line_step = line_height + interline_spacing
+        return line_height, 2
 
-    total_text_height = (num_lines * line_step) - interline_spacing
+def render_text_lines(lines, font, width, alignment='left', atlas=None):
+    """Draws wrapped [(line, line_width)] onto a 1-bit bitmap; glyphs come from `atlas` when given."""
+    from PIL import Image, ImageDraw
+    if not lines: return Image.new('1', (width, 1), color=1)
+
+    # Calculate line height and total text height
+    line_height, interline_spacing = text_line_metrics(font)
+    line_step = line_height + interline_spacing
+    total_text_height = (len(lines) * line_step) - interline_spacing
     if total_text_height <= 0: total_text_height = line_height
-    img_height = total_text_height
 
-    img_text = Image.new('1', (width, img_height), color=1) # Background white
-    draw = ImageDraw.Draw(img_text)
+    img_text = Image.new('1', (width, total_text_height), color=1) # Background white
+    draw = ImageDraw.Draw(img_text) if atlas is None else None
     current_y = 0
-    for line in lines:
-        line_width = get_text_width(line)
+    for line, line_width in lines:
         x_position = 0 # Default to left
         if alignment == 'center':
             x_position = (width - line_width) // 2
         elif alignment == 'right':
             x_position = width - line_width
 
-        draw.text((x_position, current_y), line, font=font, fill=0) # Text black
+        if atlas is not None: atlas.draw(img_text, x_position, current_y, line)
+        else: draw.text((x_position, current_y), line, font=font, fill=0) # Text black
         current_y += line_step
+    return img_text
 
-    print(f"Created text bitmap: num_lines={num_lines}, height={img_height}, align={alignment}")
+def create_text_bitmap(text, font, width, alignment='left', atlas=None):
+    """Renders multiline text onto a 1-bit bitmap with basic word wrapping and alignment."""
+    lines = wrap_text(text, font, width, atlas)
+    img_text = render_text_lines(lines, font, width, alignment, atlas)
+    if lines: print(f"Created text bitmap: num_lines={len(lines)}, height={img_text.height}, align={alignment}")
     return img_text
+
+# A text file (or '-' for stdin) printed band by band as it is read, see iter_text_bands()
+StreamText = namedtuple('StreamText', ['path', 'font_name', 'font_size', 'alignment'])
+
+def iter_text_file_lines(path):
+    """Yields the lines of a text file, or of stdin for '-', without reading it all."""
+    f = sys.stdin if path == '-' else open(path, encoding='utf-8', errors='replace')
+    try:
+        for line in f: yield line.rstrip('\r\n').expandtabs(4)
+    finally:
+        if f is not sys.stdin: f.close()
+
+def iter_text_bands(source, width=PRINTER_WIDTH_PIXELS, band_lines=TEXT_STREAM_BAND_LINES):
+    """Yields a StreamText as PackedRasters of `band_lines` wrapped lines each (the last may be shorter).
+
+    Only one band of input is held in memory, so any input length prints with flat memory.
+    """
+    font = load_font(source.font_name, source.font_size)
+    spacing_rows = bytes(PRINTER_WIDTH_BYTES * text_line_metrics(font)[1]) # Gap below each band's last line
+    spacing_height = len(spacing_rows) // PRINTER_WIDTH_BYTES
+    pending = []
+    def band():
+        raster = pack_raster(render_text_lines(pending, font, width, source.alignment))
+        return PackedRaster(raster.data + spacing_rows, raster.height + spacing_height)
+    for line in iter_text_file_lines(source.path):
+        pending.extend(wrap_text(line, font, width) if line else [("", 0)])
+        while len(pending) >= band_lines:
+            rest = pending[band_lines:]
+            del pending[band_lines:]
+            yield band()
+            pending = rest
+    if pending: yield band()
+
+def stream_text_to_bitmap(source):
+    """Assembles a StreamText into a single 1-bit image (used by --debug-save)."""
+    bands = list(iter_text_bands(source))
+    return packed_to_image(b"".join(band.data for band in bands), sum(band.height for band in bands))
+
+# --- Glyph Atlas and Templates ---
+class GlyphAtlas:
+    """1-bit bitmaps of a font's glyphs, rendered once and pasted into pages.
+
+    Drawing a line is one paste per character instead of a FreeType render of the whole line.
+    Characters are placed by their advance widths (no kerning).
+    """
+    def __init__(self, font):
+        self.font = font
+        self._glyphs = {} # Character -> (mask or None, left, top, advance)
+
+    def glyph(self, char):
+        glyph = self._glyphs.get(char)
+        if glyph is None:
+            from PIL import Image, ImageDraw
+            left, top, right, bottom = (int(v) for v in self.font.getbbox(char))
+            mask = None
+            if right > left and bottom > top:
+                mask = Image.new('1', (right - left, bottom - top), 0)
+                ImageDraw.Draw(mask).text((-left, -top), char, font=self.font, fill=1)
+            glyph = self._glyphs[char] = (mask, left, top, get_text_width(self.font, char))
+        return glyph
+
+    def width(self, text):
+        return sum(self.glyph(char)[3] for char in text)
+
+    def draw(self, page, x, y, text):
+        """Draws text in black onto a 1-bit page with its top-left at (x, y)."""
+        for char in text:
+            mask, left, top, advance = self.glyph(char)
+            if mask is not None: page.paste(0, (int(round(x)) + left, y + top), mask)
+            x += advance
+
+@functools.lru_cache(maxsize=FONT_CACHE_SIZE)
+def get_glyph_atlas(font):
+    """One atlas per loaded font; fonts are shared per (path, size) by _load_truetype."""
+    return GlyphAtlas(font)
+
+class TextTemplate:
+    """A receipt or label layout with {field} placeholders.
+
+    Runs of lines without placeholders are rendered once when the template is built; each
+    render() only wraps and draws the lines that contain fields, using the font's GlyphAtlas.
+    A malformed template (e.g. a lone '}') raises ValueError naming the line.
+    """
+    def __init__(self, source, font, width=PRINTER_WIDTH_PIXELS, alignment='left'):
+        self.font = font
+        self.width = width
+        self.alignment = alignment
+        self.atlas = get_glyph_atlas(font)
+        self.spacing = text_line_metrics(font)[1]
+        self.fields = set()
+        self.parts = [] # Pre-rendered static Image, or the format string of a variable line
+        static = []
+        for number, line in enumerate(source.split('\n'), 1):
+            try:
+                names = [name for _, name, _, _ in string.Formatter().parse(line) if name is not None]
+                if '' in names: raise ValueError("empty {} placeholder, use {name}")
+                if not names:
+                    static.append(line.format()) # Unescapes {{ and }}
+                    continue
+            except ValueError as e: raise ValueError(f"Template line {number}: {e} (write {{{{ and }}}} for literal braces)")
+            if static: self.parts.append(self._render('\n'.join(static))); static = []
+            self.parts.append(line)
+            self.fields.update(names)
+        if static: self.parts.append(self._render('\n'.join(static)))
+
+    def _render(self, text):
+        return render_text_lines(wrap_text(text, self.font, self.width, self.atlas), self.font, self.width, self.alignment, self.atlas)
+
+    def render(self, fields):
+        """Renders one page; raises ValueError if a field is missing or can't be formatted."""
+        from PIL import Image
+        try: images = [part if not isinstance(part, str) else self._render(part.format_map(fields)) for part in self.parts]
+        except KeyError as e: raise ValueError(f"Missing template field {e}")
+        except (ValueError, AttributeError, IndexError, TypeError) as e: raise ValueError(f"Can't fill template: {e}")
+        height = sum(img.height for img in images) + self.spacing * (len(images) - 1)
+        page = Image.new('1', (self.width, max(1, height)), color=1)
+        y = 0
+        for img in images:
+            page.paste(img, (0, y))
+            y += img.height + self.spacing
+        return page
 # --------------------------------------
 
 # --- Image Data Processing ---
+PACK_BAND_HEIGHT = 256 # Rows packed per band when streaming raster data
+
+def _build_pack_table():
+    """Builds the byte translation table from PIL '1' packing to printer packing.
+
+    PIL packs 1-bit rows MSB-first with 1=white; the printer expects LSB-first with 1=black,
+    so every byte is inverted and bit-reversed.
+    """
+    table = bytearray(256)
+    for value in range(256):
+        inverted = ~value & 0xFF
+        reversed_bits = 0
+        for bit in range(8):
+            if inverted & (1 << bit): reversed_bits |= 1 << (7 - bit)
+        table[value] = reversed_bits
+    return bytes(table)
+
+PACK_TABLE = _build_pack_table()
+
+def _to_packable(img):
+    """Returns a mode '1' image where only pixels that were exactly 0 are black."""
+    from PIL import Image
+    if img.mode == '1': return img
+    if img.mode != 'L': img = img.convert('L')
+    # Only pure black counts as a printed dot, matching the original per-pixel check
+    return img.point(lambda v: 255 if v else 0).convert('1', dither=Image.Dither.NONE)
+
+def iter_packed_bands(img, band_height=PACK_BAND_HEIGHT):
+    """Yields the printer byte format of a PIL image in bands of at most band_height rows."""
+    img = _to_packable(img)
+    width, height = img.size
+    row_bytes = (width + 7) // 8
+    tail_bits = width % 8
+    tail_mask = (1 << tail_bits) - 1 # Clears PIL's row padding bits after translation
+    for y in range(0, height, band_height):
+        band = img.crop((0, y, width, min(y + band_height, height)))
+        data = band.tobytes().translate(PACK_TABLE)
+        if tail_bits:
+            data = bytearray(data)
+            for i in range(row_bytes - 1, len(data), row_bytes): data[i] &= tail_mask
+            data = bytes(data)
+        yield data
+
 def process_image(img):
     """Converts a 1-bit PIL image into the byte format required by the printer."""
-    pixels = list(img.getdata())
-    width, height = img.size
-    processed_data = bytearray()
-    # Pack 8 pixels into one byte, row by row
-    for y in range(height):
-        byte = 0
-        for x in range(width):
-            pixel_index = y * width + x
-            pixel_value = pixels[pixel_index] # 0=black, 255/1=white in PIL '1' mode
-            if pixel_value == 0: # Set bit for black pixel
-                byte |= (1 << (x % 8)) 
-            # If byte is full or end of row reached, append it
-            if (x + 1) % 8 == 0 or (x + 1) == width:
-                processed_data.append(byte)
-                byte = 0 # Reset for next byte
-    return bytes(processed_data)
+    return b"".join(iter_packed_bands(img))
+
+def packed_to_image(data, height, width=PRINTER_WIDTH_PIXELS):
+    """Converts printer bytes back into a 1-bit PIL image (inverse of process_image)."""
+    from PIL import Image
+    # The pack table is its own inverse (invert and bit-reverse)
+    return Image.frombytes('1', (width, height), bytes(data).translate(PACK_TABLE))
+
+# A prepared job in printer format: packed row bytes plus the number of rows
+PackedRaster = namedtuple('PackedRaster', ['data', 'height'])
+
+def pack_raster(img):
+    """Packs a 1-bit PIL image into a PackedRaster."""
+    return PackedRaster(process_image(img), img.height)
+
+# A paper feed queued as a print job (used by --feed-after when the rows can't join the previous raster)
+FeedJob = namedtuple('FeedJob', ['lines'])
+
+def find_blank_runs(data, row_bytes=PRINTER_WIDTH_BYTES, min_rows=1):
+    """Returns (first_row, rows) for every run of at least min_rows blank rows in packed printer data.
+
+    A blank row is all 0x00 bytes (no dots). Zero-byte runs are found by a regex scan, which runs
+    in C, and then aligned to row boundaries, so there is no Python loop over rows or pixels.
+    """
+    runs = []
+    for match in re.finditer(b'\x00{%d,}' % (row_bytes * min_rows), data):
+        first, end = -(-match.start() // row_bytes), match.end() // row_bytes
+        if end - first >= min_rows: runs.append((first, end - first))
+    return runs
+
+def trim_raster(raster, margin=None, max_gap=None):
+    """Shortens the blank rows of a PackedRaster. Returns (new raster, rows removed).
+
+    Blank runs at the top and bottom are capped at `margin` rows, and runs between printed rows
+    at `max_gap` rows; None leaves that kind of run alone. A raster with no dots at all keeps
+    `margin` rows (at least one).
+    """
+    limits = [limit for limit in (margin, max_gap) if limit is not None]
+    if not limits: return raster, 0
+    cuts = [] # (first_row, rows) to drop, in order
+    for first, rows in find_blank_runs(raster.data, min_rows=min(limits) + 1):
+        at_top, at_bottom = first == 0, first + rows == raster.height
+        if at_top and at_bottom:
+            if margin is not None: cuts.append((0, rows - max(margin, 1)))
+        elif at_top or at_bottom:
+            if margin is not None and rows > margin: cuts.append((0 if at_top else first + margin, rows - margin))
+        elif max_gap is not None and rows > max_gap:
+            cuts.append((first + max_gap, rows - max_gap))
+    cuts = [(first, rows) for first, rows in cuts if rows > 0]
+    if not cuts: return raster, 0
+    parts, pos = [], 0
+    for first, rows in cuts:
+        parts.append(raster.data[pos * PRINTER_WIDTH_BYTES:first * PRINTER_WIDTH_BYTES])
+        pos = first + rows
+    parts.append(raster.data[pos * PRINTER_WIDTH_BYTES:])
+    removed = sum(rows for _, rows in cuts)
+    return PackedRaster(b"".join(parts), raster.height - removed), removed
 # -----------------------------------------------------------------
 
+# --- Prepared Raster Cache ---
+RASTER_CACHE_DIR = os.path.join(CACHE_DIR, 'rasters')
+RASTER_CACHE_VERSION = 2 # Bump when the preparation output changes, so old entries stop matching
+DEFAULT_RASTER_CACHE_MB = 100 # Size limit of the on-disk cache before least recently used entries are evicted
+
+class RasterCache:
+    """On-disk, content-addressed cache of PackedRasters with LRU eviction.
+
+    Entries are named by a hash of the source and every parameter that affects the output.
+    A hit refreshes the entry's mtime, and eviction removes the oldest mtimes first.
+    """
+    def __init__(self, directory=RASTER_CACHE_DIR, max_bytes=DEFAULT_RASTER_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.bin')
+
+    def get(self, key):
+        """Returns the cached PackedRaster for key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f: blob = f.read()
+            height = int.from_bytes(blob[:4], 'little')
+            data = blob[4:]
+            if len(blob) < 4 or height == 0 or len(data) != height * PRINTER_WIDTH_BYTES: raise ValueError("truncated entry")
+            os.utime(path) # Mark as recently used
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return PackedRaster(data, height)
+
+    def put(self, key, raster):
+        """Stores a PackedRaster, then evicts old entries if the cache is over its size limit."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(raster.height.to_bytes(4, 'little')); f.write(raster.data)
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+        except OSError as e:
+            print(f"    Info: Could not write raster cache entry: {e}")
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.bin'):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            try: os.remove(path); total -= size
+            except OSError: pass
+
+    def stats(self):
+        return f"{self.hits} hit(s), {self.misses} miss(es)"
+
+_raster_cache = None
+
+def get_raster_cache(args):
+    """Returns the shared RasterCache, or None when caching is disabled with --no-cache or --cache-size 0."""
+    global _raster_cache
+    cache_mb = getattr(args, 'cache_size', None)
+    if cache_mb is None: cache_mb = DEFAULT_RASTER_CACHE_MB
+    if getattr(args, 'no_cache', False) or cache_mb == 0: return None
+    if _raster_cache is None:
+        _raster_cache = RasterCache(max_bytes=int(cache_mb * 1024 * 1024))
+    return _raster_cache
+
+def raster_params(args):
+    """Parameters that change the prepared output, shared by image and text cache keys."""
+    return {"version": RASTER_CACHE_VERSION, "width": PRINTER_WIDTH_PIXELS, "upside_down": bool(args.upside_down), "dither": list(dither_args(args)), "decode": decode_preset(args)}
+
+def _make_cache_key(kind, params, content_hash):
+    key_source = json.dumps({"kind": kind, "params": params, "content": content_hash}, sort_keys=True)
+    return hashlib.sha256(key_source.encode()).hexdigest()
+
+def image_cache_key(image_path, args):
+    """Cache key for an image file: hash of its contents plus the output parameters."""
+    digest = hashlib.sha256()
+    with open(image_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''): digest.update(block)
+    return _make_cache_key("image", raster_params(args), digest.hexdigest())
+
+def text_cache_key(text, font_name, font_size, alignment, args):
+    """Cache key for a text job: the text, font (and the file it resolves to), size and alignment."""
+    params = {**raster_params(args), "font": font_name, "font_path": resolve_font_path(font_name), "size": font_size, "align": alignment}
+    return _make_cache_key("text", params, hashlib.sha256(text.encode('utf-8')).hexdigest())
+# -----------------------------------------------------------------
+
+# --- Job Metrics ---
+class JobMetrics:
+    """Per-phase timings and throughput of one print job or paper feed.
+
+    Phases: handshake (B1/A2/A1 -> A1), print_request (A2/A9 -> A9), prepare (waiting for
+    streamed bands), transfer (AE03 data), print_wait (AD -> AA) and delay (fixed sleeps).
+    """
+    def __init__(self, kind, description, printer=""):
+        self.kind = kind
+        self.description = description
+        self.printer = printer
+        self.started_at = time.time()
+        self.phases = {}
+        self.bytes_sent = 0
+        self.rows = 0
+        self.success = False
+        self.printer_ready = False # AA arrived, so the next job can start without a pause
+        self._start = time.perf_counter()
+        self.duration = 0.0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Adds the time spent inside the block to the named phase."""
+        start = time.perf_counter()
+        try: yield
+        finally: self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    async def sleep(self, seconds):
+        """A fixed pause, accounted as the 'delay' phase."""
+        with self.phase("delay"): await asyncio.sleep(seconds)
+
+    def finish(self, success):
+        self.success = success
+        self.duration = time.perf_counter() - self._start
+        return success
+
+    @property
+    def bytes_per_second(self):
+        transfer = self.phases.get("transfer", 0.0)
+        return self.bytes_sent / transfer if transfer > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "timestamp": self.started_at, "printer": self.printer, "kind": self.kind, "description": self.description,
+            "success": self.success, "duration_seconds": round(self.duration, 6),
+            "phases": {name: round(seconds, 6) for name, seconds in self.phases.items()},
+            "bytes_sent": self.bytes_sent, "rows": self.rows, "bytes_per_second": round(self.bytes_per_second, 1),
+        }
+
+    def summary(self):
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases.items())
+        return f"  Timing: total {self.duration:.2f}s ({phases}); {self.bytes_sent} bytes, {self.rows} rows, {self.bytes_per_second:.0f} B/s"
+
+PROM_SAMPLE = re.compile(r'^(mxw01_\w+)\{([^}]*)\} (\S+)$') # One sample line of the textfile we write
+PROM_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+@contextlib.contextmanager
+def _file_lock(path):
+    """Holds an exclusive flock on `path` (created if missing); no lock where fcntl or the file is unavailable."""
+    try:
+        import fcntl
+        lock_file = open(path, 'a')
+    except (ImportError, OSError):
+        yield; return
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+class MetricsRecorder:
+    """Writes finished JobMetrics as JSON lines and/or a Prometheus textfile-collector file.
+
+    The textfile holds the running totals: every job's numbers are added to what the file already
+    contains, so counters keep growing across CLI runs (and across a daemon and direct runs).
+    Each update holds a lock on a sidecar `.lock` file, so concurrent writers don't lose increments.
+    """
+    def __init__(self, jsonl_path=None, prom_path=None):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+
+    def record(self, metrics):
+        print(metrics.summary())
+        if self.jsonl_path:
+            try:
+                with open(self.jsonl_path, 'a') as f: f.write(json.dumps(metrics.as_dict()) + "\n")
+            except OSError as e: print(f"    Warning: Could not write metrics to '{self.jsonl_path}': {e}")
+        if self.prom_path:
+            with _file_lock(self.prom_path + ".lock"): # Read-modify-write of the shared totals
+                totals, last = self._read_prometheus()
+                key = (metrics.printer, metrics.kind, "ok" if metrics.success else "error")
+                entry = totals.setdefault(key, [0, 0, 0, {}])
+                entry[0] += 1; entry[1] += metrics.bytes_sent; entry[2] += metrics.rows
+                for name, seconds in metrics.phases.items(): entry[3][name] = entry[3].get(name, 0.0) + seconds
+                last[metrics.printer] = (metrics.bytes_per_second, metrics.duration)
+                self._write_prometheus(totals, last)
+
+    def _read_prometheus(self):
+        """Returns (totals, last job gauges) from the existing textfile; empty if there is none.
+
+        totals: (printer, kind, result) -> [jobs, bytes, rows, {phase: seconds}];
+        last: printer -> (bytes per second, duration) of its last finished job.
+        """
+        totals, last = {}, {}
+        try:
+            with open(self.prom_path) as f: lines = f.read().splitlines()
+        except OSError: return totals, last
+        for line in lines:
+            match = PROM_SAMPLE.match(line)
+            if not match: continue
+            name, labels = match.group(1), dict(PROM_LABEL.findall(match.group(2)))
+            try: value = float(match.group(3))
+            except ValueError: continue
+            printer = labels.get("printer", "")
+            if name.startswith("mxw01_last_job_"):
+                rate, duration = last.get(printer, (0.0, 0.0))
+                last[printer] = (value, duration) if name == "mxw01_last_job_bytes_per_second" else (rate, value)
+                continue
+            entry = totals.setdefault((printer, labels.get("kind", ""), labels.get("result", "")), [0, 0, 0, {}])
+            if name == "mxw01_jobs_total": entry[0] = int(value)
+            elif name == "mxw01_bytes_sent_total": entry[1] = int(value)
+            elif name == "mxw01_rows_printed_total": entry[2] = int(value)
+            elif name == "mxw01_phase_seconds_total": entry[3][labels.get("phase", "")] = value
+        return totals, last
+
+    def _write_prometheus(self, totals, last):
+        lines = [
+            "# HELP mxw01_jobs_total Print jobs and paper feeds finished.", "# TYPE mxw01_jobs_total counter",
+        ]
+        label = lambda printer, kind, result: f'printer="{printer}",kind="{kind}",result="{result}"'
+        for (printer, kind, result), (jobs, _, _, _) in sorted(totals.items()):
+            lines.append(f"mxw01_jobs_total{{{label(printer, kind, result)}}} {jobs}")
+        lines += ["# HELP mxw01_bytes_sent_total Raster bytes sent to AE03.", "# TYPE mxw01_bytes_sent_total counter"]
+        for (printer, kind, result), (_, sent, _, _) in sorted(totals.items()):
+            lines.append(f"mxw01_bytes_sent_total{{{label(printer, kind, result)}}} {sent}")
+        lines += ["# HELP mxw01_rows_printed_total Raster rows printed or fed.", "# TYPE mxw01_rows_printed_total counter"]
+        for (printer, kind, result), (_, _, rows, _) in sorted(totals.items()):
+            lines.append(f"mxw01_rows_printed_total{{{label(printer, kind, result)}}} {rows}")
+        lines += ["# HELP mxw01_phase_seconds_total Time spent per job phase.", "# TYPE mxw01_phase_seconds_total counter"]
+        for (printer, kind, result), (_, _, _, phases) in sorted(totals.items()):
+            for name, seconds in sorted(phases.items()):
+                lines.append(f'mxw01_phase_seconds_total{{{label(printer, kind, result)},phase="{name}"}} {seconds:.6f}')
+        lines += ["# HELP mxw01_last_job_bytes_per_second Transfer throughput of the last job.", "# TYPE mxw01_last_job_bytes_per_second gauge"]
+        for printer, (rate, _) in sorted(last.items()):
+            lines.append(f'mxw01_last_job_bytes_per_second{{printer="{printer}"}} {rate:.1f}')
+        lines += ["# HELP mxw01_last_job_duration_seconds Wall time of the last job.", "# TYPE mxw01_last_job_duration_seconds gauge"]
+        for printer, (_, duration) in sorted(last.items()):
+            lines.append(f'mxw01_last_job_duration_seconds{{printer="{printer}"}} {duration:.6f}')
+        try:
+            tmp_path = self.prom_path + ".tmp" # Atomic replace, as the textfile collector expects
+            with open(tmp_path, 'w') as f: f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, self.prom_path)
+        except OSError as e: print(f"    Warning: Could not write metrics to '{self.prom_path}': {e}")
+
+_metrics_recorder = MetricsRecorder() # Prints timing summaries; configure_metrics() adds file outputs
+
+def configure_metrics(args):
+    global _metrics_recorder
+    _metrics_recorder = MetricsRecorder(getattr(args, 'metrics_jsonl', None), getattr(args, 'metrics_prom', None))
+
+def record_job_metrics(metrics):
+    _metrics_recorder.record(metrics)
+# ---------------------------------
+
+# --- Print Speed Model ---
+SPEED_MODEL_PATH = os.path.join(CACHE_DIR, 'print_speed.json')
+SPEED_MODEL_VERSION = 2 # 2: samples kept per printer and kind of session
+SPEED_MODEL_SAMPLES = 50 # Recent AD -> AA measurements kept per printer and kind
+SPEED_TIMEOUT_FACTOR = 2.0 # AA timeout = predicted time * factor + margin...
+SPEED_TIMEOUT_MARGIN = 3.0
+SPEED_MIN_TIMEOUT = 5.0 # ...but never below this
+
+class PrintSpeedModel:
+    """Learns how long each printer takes from AD to AA, as time = overhead + rows / rows_per_second.
+
+    Every completed session adds a (rows, seconds) sample; the two parameters are a least-squares
+    fit over the recent samples of that printer and kind of session. Paper feeds ("feed") move much
+    faster than dense prints ("print"), so they are learned separately and a few feeds can't shorten
+    the timeout of a tall photo. The samples are kept on disk when a path is given.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.printers = {} # Address -> {kind: list of [rows, seconds]}
+        if path:
+            try:
+                with open(path) as f: data = json.load(f)
+                if data.get("version") == SPEED_MODEL_VERSION: self.printers = data.get("printers", {})
+            except (OSError, ValueError): pass
+
+    def estimate(self, address, kind="print"):
+        """Returns (overhead seconds, rows per second) for a printer and kind, or None without history."""
+        samples = self.printers.get(address, {}).get(kind)
+        if not samples: return None
+        n = len(samples)
+        mean_rows = sum(rows for rows, _ in samples) / n
+        mean_seconds = sum(seconds for _, seconds in samples) / n
+        spread = sum((rows - mean_rows) ** 2 for rows, _ in samples)
+        if spread > 0:
+            slope = sum((rows - mean_rows) * (seconds - mean_seconds) for rows, seconds in samples) / spread
+            overhead = mean_seconds - slope * mean_rows
+            if slope > 0 and overhead >= 0: return overhead, 1.0 / slope
+        # All jobs the same height (or a noisy fit): treat the whole time as paper motion
+        return 0.0, mean_rows / mean_seconds if mean_seconds > 0 else float('inf')
+
+    def predict(self, address, rows, kind="print"):
+        """Expected seconds from AD to AA, or None without history."""
+        estimate = self.estimate(address, kind)
+        if estimate is None: return None
+        overhead, rows_per_second = estimate
+        return overhead + rows / rows_per_second
+
+    def aa_timeout(self, address, rows, kind="print"):
+        """How long to wait for AA: a generous multiple of the prediction, or the old heuristic."""
+        predicted = self.predict(address, rows, kind)
+        if predicted is None: return max(15.0, rows / 20.0) # No history yet: rough estimate
+        return max(SPEED_MIN_TIMEOUT, predicted * SPEED_TIMEOUT_FACTOR + SPEED_TIMEOUT_MARGIN)
+
+    def observe(self, address, rows, seconds, kind="print"):
+        samples = self.printers.setdefault(address, {}).setdefault(kind, [])
+        samples.append([rows, round(seconds, 4)])
+        del samples[:-SPEED_MODEL_SAMPLES]
+        if self.path: self._save()
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f: json.dump({"version": SPEED_MODEL_VERSION, "printers": self.printers}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e: print(f"Warning: Could not save print speed history: {e}")
+
+_speed_model = PrintSpeedModel() # In memory until configure_speed_model() points it at the history file
+
+def configure_speed_model(args):
+    """Uses the on-disk history, except for simulated printers whose speed is whatever --sim-speed says."""
+    global _speed_model
+    _speed_model = PrintSpeedModel(None if getattr(args, 'simulate', False) else SPEED_MODEL_PATH)
+
+def get_speed_model():
+    return _speed_model
+# ---------------------------------
+
 # --- Bluetooth Communication ---
-received_responses = {} # Dictionary to store received notifications by command ID
-notification_condition = asyncio.Condition() # Used to wait for specific notifications
-
-async def notification_handler(sender, data):
-    """Callback for handling incoming BLE notifications."""
-    global received_responses
-    cmd_id, payload = parse_response(data)
-    if cmd_id is not None:
-        async with notification_condition:
-            received_responses[cmd_id] = payload 
-            notification_condition.notify_all() # Wake up tasks waiting for this response
+NOTIFICATION_LOG_SIZE = 32 # Unsolicited notifications kept per connection
+
+class NotificationDispatcher:
+    """Routes the AE02 notifications of one printer connection to the coroutines waiting for them.
+
+    A waiter registers the command ID it expects (A1, A9, AA) *before* sending the command that
+    triggers it and gets a future resolved by the matching notification. Notifications nobody
+    waits for (late replies after a timeout, status pushes) go to the bounded `unsolicited` log.
+    """
+    def __init__(self, log_size=NOTIFICATION_LOG_SIZE):
+        self._waiters = {} # Command ID -> future of the pending request
+        self.unsolicited = deque(maxlen=log_size) # (time, command ID, payload)
+
+    def handle(self, sender, data):
+        """Notification callback for client.start_notify()."""
+        cmd_id, payload = parse_response(data)
+        if cmd_id is None: return
+        future = self._waiters.get(cmd_id) # wait() unregisters it once the payload is taken
+        if future is not None and not future.done(): future.set_result(payload)
+        else: self.unsolicited.append((time.time(), cmd_id, payload))
+
+    def expect(self, cmd_id):
+        """Registers interest in the next cmd_id notification; call before sending the request."""
+        previous = self._waiters.get(cmd_id)
+        if previous is not None: previous.cancel()
+        self._waiters[cmd_id] = asyncio.get_running_loop().create_future()
+
+    async def wait(self, cmd_id, timeout):
+        """Waits for the notification registered with expect() and returns its payload."""
+        future = self._waiters.get(cmd_id)
+        if future is None: raise RuntimeError(f"Not expecting a {cmd_id:02X} notification")
+        try: return await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            if self._waiters.get(cmd_id) is future: del self._waiters[cmd_id]
+
+    async def start(self, client):
+        await client.start_notify(NOTIFY_UUID, self.handle)
 
 def parse_response(data):
     """Parses a raw notification response packet."""
@@ -350,97 +1244,309 @@ def check_a9_status(payload):
     print(f"  [Check A9 Status] Print Request OK: {is_ok}")
     return is_ok
 
-async def run_print_job(client, img_final, job_description):
-    """Sends the necessary commands and data to print a single prepared image."""
-    global received_responses
+def get_client_factory(args):
+    """Returns the class used to connect: BleakClient, or a simulated printer with --simulate."""
+    if getattr(args, 'simulate', False):
+        from MXW01sim import SimulatedBleakClient, printer_for
+        print(f"Using simulated printer ({args.sim_speed:g} rows/s).")
+        def connect(address, **kwargs): # One simulated printer per address, kept across reconnects
+            return SimulatedBleakClient(address, printer=printer_for(address, rows_per_second=args.sim_speed), **kwargs)
+        return connect
+    from bleak import BleakClient
+    return BleakClient
+
+def get_bluetooth_errors(args):
+    """(BleakError,) to catch connection errors with; () when simulating without bleak installed."""
+    try: from bleak.exc import BleakError
+    except ImportError:
+        if getattr(args, 'simulate', False): return ()
+        raise
+    return (BleakError,)
+
+def get_data_chunk_size(client, data_char):
+    """Determines the payload size per AE03 write from the negotiated MTU."""
+    size = 0
+    try: size = data_char.max_write_without_response_size or 0
+    except Exception: pass
+    if size <= DEFAULT_DATA_CHUNK_SIZE:
+        # Some backends only report the MTU on the client
+        try: size = max(size, client.mtu_size - 3)
+        except Exception: pass
+    return max(DEFAULT_DATA_CHUNK_SIZE, min(size, MAX_DATA_CHUNK_SIZE))
+
+async def send_data(client, data_char, data, chunk_size=None, window=TRANSFER_WINDOW):
+    """Streams bulk data to AE03 in MTU-sized chunks, keeping a bounded window of writes in flight.
+
+    Writes are started in order, so the BLE stack queues them in order. A congested link
+    rejects every write until its queue drains, so when a write fails no further writes are
+    started, the rest of the window is awaited, the window is halved and everything from the
+    failed chunk onward is resent after a short back-off; the window grows back by one after
+    each run of clean writes. AE03 is a plain byte stream, so if a later write of the window
+    went through after an earlier one failed, the printer already has the data out of order
+    and the transfer fails instead of resending (with a window of 1 this can't happen).
+    Returns a dict with the bytes sent, elapsed seconds and achieved bytes per second.
+    """
+    view = memoryview(data)
+    total = len(view)
+    limit = get_data_chunk_size(client, data_char)
+    chunk_size = min(chunk_size, limit) if chunk_size else limit # Writes beyond the negotiated size get dropped
+    max_window = max(1, window)
+    window = max_window
+    pending = deque(range(0, total, chunk_size)) # Offsets still to write
+    in_flight = deque() # (offset, task) in write order
+    retries = 0
+    clean_writes = 0
+    start = time.perf_counter()
+    while pending or in_flight:
+        while pending and len(in_flight) < window:
+            offset = pending.popleft()
+            chunk = bytes(view[offset:offset + chunk_size])
+            task = asyncio.ensure_future(client.write_gatt_char(data_char, chunk, response=False))
+            in_flight.append((offset, task))
+
+        offset, task = in_flight.popleft()
+        try:
+            await task
+        except Exception as e:
+            # Congestion: let the rest of the window settle, then resend from the failed chunk onward
+            results = await asyncio.gather(*(other_task for _, other_task in in_flight), return_exceptions=True)
+            if not all(isinstance(result, Exception) for result in results):
+                raise ValueError(f"Data write at offset {offset} failed ({e}) after later data was sent; the printer received it out of order")
+            pending.extendleft(reversed([offset] + [other_offset for other_offset, _ in in_flight]))
+            in_flight.clear()
+            retries += 1
+            if retries > TRANSFER_MAX_RETRIES: raise ValueError(f"Data transfer failed after {retries - 1} retries: {e}")
+            window = max(1, window // 2)
+            clean_writes = 0
+            print(f"  Write rejected ({e}); backing off, window={window}")
+            await asyncio.sleep(TRANSFER_BACKOFF_DELAY * retries)
+            continue
+
+        clean_writes += 1
+        if window < max_window and clean_writes >= 64:
+            window += 1
+            clean_writes = 0
+
+    elapsed = time.perf_counter() - start
+    rate = total / elapsed if elapsed > 0 else float('inf')
+    print(f"  Sent {total} bytes in {elapsed:.2f}s ({rate:.0f} B/s, chunk={chunk_size}, window={max_window}, retries={retries})")
+    return {"bytes": total, "seconds": elapsed, "bytes_per_sec": rate, "chunk_size": chunk_size, "retries": retries}
+
+def get_printer_characteristics(client):
+    """Looks up the control (AE01) and data (AE03) characteristics, checking AE02 is present too."""
+    ae01_char = client.services.get_characteristic(CONTROL_WRITE_UUID)
+    ae02_char = client.services.get_characteristic(NOTIFY_UUID)
+    ae03_char = client.services.get_characteristic(DATA_WRITE_UUID)
+    if not all([ae01_char, ae02_char, ae03_char]): raise ValueError("Missing required GATT characteristic")
+    return ae01_char, ae03_char
+
+async def _send_commands(client, ae01_char, commands):
+    for cmd in commands:
+        await client.write_gatt_char(ae01_char.uuid, cmd, response=False); await asyncio.sleep(0.01)
+
+async def begin_print_session(client, notifications, ae01_char, height, metrics):
+    """Runs the setup (B1, A2, A1) and print request (A2, A9) sequences for `height` rows.
+
+    Raises ValueError if the printer does not answer or reports an error status.
+    """
+    # 1. Setup Sequence (B1, A2, A1) -> Wait/Check A1
+    with metrics.phase("handshake"):
+        notifications.expect(0xA1)
+        await _send_commands(client, ae01_char, SETUP_SEQUENCE)
+        try: payload = await notifications.wait(0xA1, timeout=7.0)
+        except asyncio.TimeoutError: raise ValueError("Timeout waiting for A1 response")
+        if not check_a1_status(payload): raise ValueError("A1 status check failed")
+
+    # 2. Print Request Sequence (A2, A9) -> Wait/Check A9
+    # A9 command declares the print dimensions; the setup frames are precomputed
+    with metrics.phase("print_request"):
+        notifications.expect(0xA9)
+        await _send_commands(client, ae01_char, [CMD_SETUP_A2, create_print_request(height)])
+        try: payload = await notifications.wait(0xA9, timeout=7.0)
+        except asyncio.TimeoutError: raise ValueError("Timeout waiting for A9 response")
+        if not check_a9_status(payload): raise ValueError("A9 status check failed")
+
+async def send_session_data(client, ae03_char, data, metrics, chunk_size=None, window=TRANSFER_WINDOW):
+    """send_data() accounted as the 'transfer' phase of a job."""
+    with metrics.phase("transfer"):
+        stats = await send_data(client, ae03_char, data, chunk_size=chunk_size, window=window)
+    metrics.bytes_sent += stats["bytes"]
+    return stats
+
+async def end_print_session(client, notifications, ae01_char, height, metrics, kind="print"):
+    """Sends the End Print Command (AD) and waits for AA (Print Complete). Returns True if AA arrived.
+
+    `kind` ("print" or "feed") selects which of the printer's learned speeds the AA timeout uses.
+    """
+    speed_model = get_speed_model()
+    with metrics.phase("print_wait"):
+        notifications.expect(0xAA)
+        start = time.perf_counter()
+        await client.write_gatt_char(ae01_char.uuid, CMD_END_PRINT_AD, response=False)
+        await asyncio.sleep(0.01)
+        try:
+            # Timeout needs to be long enough for the physical print; learned per printer
+            await notifications.wait(0xAA, timeout=speed_model.aa_timeout(client.address, height, kind))
+        except asyncio.TimeoutError:
+            metrics.printer_ready = False
+            return False
+    speed_model.observe(client.address, height, time.perf_counter() - start, kind)
+    metrics.printer_ready = True
+    metrics.rows += height
+    return True
+
+async def settle_after_job(metrics):
+    """Gives the printer a moment at the end of a job whose last AA never arrived; AA would have said it's done."""
+    if "print_wait" in metrics.phases and not metrics.printer_ready: await metrics.sleep(AA_MISSING_GRACE)
+
+def job_kind(job):
+    """Metrics kind of a prepared job: "feed" for a FeedJob, "print" for everything else."""
+    return "feed" if isinstance(job, FeedJob) else "print"
+
+def _new_metrics(client, kind, description, metrics):
+    return metrics if metrics is not None else JobMetrics(kind, description, getattr(client, 'address', ''))
+
+async def run_print_job(client, notifications, img_final, job_description, chunk_size=None, window=TRANSFER_WINDOW, metrics=None):
+    """Sends the necessary commands and data to print a single prepared image (PIL image or PackedRaster).
+
+    `notifications` is the connection's NotificationDispatcher. Phase timings are collected in `metrics` (a JobMetrics) when one is passed.
+    """
+    if isinstance(img_final, StreamImage):
+        return await run_stream_print_job(client, notifications, img_final, job_description, chunk_size=chunk_size, window=window, metrics=metrics)
+    if isinstance(img_final, StreamText):
+        return await run_stream_text_job(client, notifications, img_final, job_description, chunk_size=chunk_size, window=window, metrics=metrics)
+    if isinstance(img_final, FeedJob):
+        return await run_feed_paper(client, notifications, img_final.lines, chunk_size=chunk_size, window=window, metrics=metrics)
+    metrics = _new_metrics(client, "print", job_description, metrics)
     print(f"Processing: '{job_description}'")
-    if img_final is None: print("Error: No image data provided."); return False
+    if img_final is None: print("Error: No image data provided."); return metrics.finish(False)
 
-    printer_data = process_image(img_final)
+    raster = img_final if isinstance(img_final, PackedRaster) else pack_raster(img_final)
+    printer_data = raster.data
     final_data_len = len(printer_data)
-    image_height = img_final.height # Actual height of the image data being sent
+    image_height = raster.height # Actual height of the image data being sent
     print(f"Prepared data: {final_data_len} bytes, height={image_height}px")
+    if image_height > MAX_PRINT_HEIGHT:
+        print(f"Error: Image height {image_height}px exceeds the {MAX_PRINT_HEIGHT}px limit of one print request. Use --stream.")
+        return metrics.finish(False)
 
-    try:
-        ae01_char = client.services.get_characteristic(CONTROL_WRITE_UUID)
-        ae02_char = client.services.get_characteristic(NOTIFY_UUID)
-        ae03_char = client.services.get_characteristic(DATA_WRITE_UUID)
-        if not all([ae01_char, ae02_char, ae03_char]): raise ValueError("Missing required GATT characteristic")
-    except Exception as e: print(f"Error getting characteristics: {e}"); return False
-
-    # --- Define Commands for this Job ---
-    cmd_setup_b1 = create_command_with_crc(0xB1, bytes([0x00])) # Start print setup?
-    cmd_setup_a2_1 = create_command_with_crc(0xA2, bytes([0x5D])) # Unknown setup command
-    cmd_setup_a1_1 = create_command_with_crc(0xA1, bytes([0x00])) # Check printer status?
-    cmd_setup_a2_2 = create_command_with_crc(0xA2, bytes([0x5D])) # Unknown setup command (repeated)
-    # A9 command declares the print dimensions (height, width_bytes)
-    image_height_le = image_height.to_bytes(2, 'little') 
-    width_bytes_le = PRINTER_WIDTH_BYTES.to_bytes(2, 'little')
-    print_request_data = image_height_le + width_bytes_le
-    cmd_print_request_a9 = create_command_simple(0xA9, print_request_data)
-    # AD command signals the end of the print data
-    end_print_data = bytes([0x00])
-    cmd_end_print_ad = create_command_simple(0xAD, end_print_data)
+    try: ae01_char, ae03_char = get_printer_characteristics(client)
+    except Exception as e: print(f"Error getting characteristics: {e}"); return metrics.finish(False)
 
     # --- Send Commands + Data ---
     try:
-        # 1. Setup Sequence (B1, A2, A1) -> Wait/Check A1
-        async with notification_condition: received_responses.pop(0xA1, None) # Clear previous response
-        for cmd in [cmd_setup_b1, cmd_setup_a2_1, cmd_setup_a1_1]:
-            await client.write_gatt_char(ae01_char.uuid, cmd, response=False); await asyncio.sleep(0.01)
-        async with notification_condition:
-            try: await asyncio.wait_for(notification_condition.wait_for(lambda: 0xA1 in received_responses), timeout=7.0)
-            except asyncio.TimeoutError: raise ValueError("Timeout waiting for A1 response")
-            if not check_a1_status(received_responses.pop(0xA1)): raise ValueError("A1 status check failed")
-
-        # 2. Print Request Sequence (A2, A9) -> Wait/Check A9
-        async with notification_condition: received_responses.pop(0xA9, None) # Clear previous response
-        for cmd in [cmd_setup_a2_2, cmd_print_request_a9]:
-            await client.write_gatt_char(ae01_char.uuid, cmd, response=False); await asyncio.sleep(0.01)
-        async with notification_condition:
-            try: await asyncio.wait_for(notification_condition.wait_for(lambda: 0xA9 in received_responses), timeout=7.0)
-            except asyncio.TimeoutError: raise ValueError("Timeout waiting for A9 response")
-            if not check_a9_status(received_responses.pop(0xA9)): raise ValueError("A9 status check failed")
+        # 1-2. Setup and Print Request Sequences
+        await begin_print_session(client, notifications, ae01_char, image_height, metrics)
 
         # 3. Send Image Data (AE03) in small chunks
         print(f"Sending image data ({final_data_len} bytes) to {DATA_WRITE_UUID[-12:-8]}...")
-        max_chunk = 20 # Max bytes per write seems limited
-        for j in range(0, len(printer_data), max_chunk):
-            chunk = printer_data[j:j + max_chunk]
-            await client.write_gatt_char(ae03_char.uuid, chunk, response=False)
+        await send_session_data(client, ae03_char, printer_data, metrics, chunk_size=chunk_size, window=window)
         print("Finished sending image data.")
 
         # 4. Send End Print Command (AD) -> Wait/Check AA (Print Complete)
-        async with notification_condition: received_responses.pop(0xAA, None) # Clear previous response
-        await client.write_gatt_char(ae01_char.uuid, cmd_end_print_ad, response=False)
-        await asyncio.sleep(0.01)
-
-        # Wait for AA notification (print finished)
         print("Waiting for AA (Print Complete)...")
-        aa_received = False
-        async with notification_condition:
-            try:
-                 # Timeout needs to be long enough for the physical print
-                 timeout_print = max(15.0, image_height / 20.0) # Rough estimate
-                 await asyncio.wait_for(notification_condition.wait_for(lambda: 0xAA in received_responses), timeout=timeout_print)
-                 payload = received_responses.pop(0xAA)
-                 aa_received = True
-                 print("  AA notification received.")
-            except asyncio.TimeoutError:
-                 # This might be okay if the print completed visually, but log it.
-                 print("Warning: AA notification not received within timeout.")
-        await asyncio.sleep(0.5) # Brief pause after job completion
-
-        print(f"Print job for '{job_description}' sequence completed."); return True
-    except Exception as e: print(f"Error during print job for '{job_description}': {e}"); return False
-
-async def run_feed_paper(client, lines_to_feed):
+        if await end_print_session(client, notifications, ae01_char, image_height, metrics):
+            print("  AA notification received.")
+        else:
+            # This might be okay if the print completed visually, but log it.
+            print("Warning: AA notification not received within timeout.")
+        await settle_after_job(metrics)
+
+        print(f"Print job for '{job_description}' sequence completed."); return metrics.finish(True)
+    except Exception as e: print(f"Error during print job for '{job_description}': {e}"); return metrics.finish(False)
+
+async def run_stream_print_job(client, notifications, source, job_description, chunk_size=None, window=TRANSFER_WINDOW, metrics=None):
+    """Prints a StreamImage band by band, preparing the next band while the current one is sent.
+
+    Images taller than MAX_PRINT_HEIGHT rows are split into several A9 print sessions.
+    """
+    metrics = _new_metrics(client, "print", job_description, metrics)
+    print(f"Processing (streaming): '{job_description}'")
+    try: total_height = stream_image_height(source)
+    except Exception as e: print(f"Error reading image '{source.path}': {e}"); return metrics.finish(False)
+    try: ae01_char, ae03_char = get_printer_characteristics(client)
+    except Exception as e: print(f"Error getting characteristics: {e}"); return metrics.finish(False)
+
+    loop = asyncio.get_running_loop()
+    bands = iter_stream_bands(source)
+    next_band = lambda: next(bands, None)
+    pending = bytearray() # Packed rows prepared but not yet sent
+    band_future = loop.run_in_executor(None, next_band)
+    sessions = math.ceil(total_height / MAX_PRINT_HEIGHT)
+    rows_done = 0
+    try:
+        for session_num in range(1, sessions + 1):
+            session_height = min(MAX_PRINT_HEIGHT, total_height - rows_done)
+            session_bytes = session_height * PRINTER_WIDTH_BYTES
+            print(f"--- Stream session {session_num}/{sessions}: {session_height} rows ---")
+            await begin_print_session(client, notifications, ae01_char, session_height, metrics)
+            sent = 0
+            while sent < session_bytes:
+                if not pending:
+                    with metrics.phase("prepare"): band = await band_future
+                    if band is None: raise ValueError("Image data ended before the declared height")
+                    pending += band
+                    band_future = loop.run_in_executor(None, next_band) # Prepare the next band meanwhile
+                take = min(len(pending), session_bytes - sent)
+                await send_session_data(client, ae03_char, memoryview(pending)[:take], metrics, chunk_size=chunk_size, window=window)
+                del pending[:take]
+                sent += take
+            print("Waiting for AA (Print Complete)...")
+            if await end_print_session(client, notifications, ae01_char, session_height, metrics):
+                print("  AA notification received.")
+            else:
+                print("Warning: AA notification not received within timeout.")
+            rows_done += session_height
+        await settle_after_job(metrics)
+        print(f"Print job for '{job_description}' sequence completed ({total_height} rows streamed)."); return metrics.finish(True)
+    except Exception as e: print(f"Error during print job for '{job_description}': {e}"); return metrics.finish(False)
+    finally:
+        try: await band_future # Don't leave the preparation thread running on a failed job
+        except Exception: pass
+
+async def run_stream_text_job(client, notifications, source, job_description, chunk_size=None, window=TRANSFER_WINDOW, metrics=None):
+    """Prints a StreamText band by band as the input is read, one print session per band.
+
+    The total height isn't known in advance (stdin), so each band declares its own A9 height;
+    the next band is read and rendered while the current one is sent and printed.
+    """
+    metrics = _new_metrics(client, "print", job_description, metrics)
+    print(f"Processing (streaming text): '{job_description}'")
+    try: ae01_char, ae03_char = get_printer_characteristics(client)
+    except Exception as e: print(f"Error getting characteristics: {e}"); return metrics.finish(False)
+
+    loop = asyncio.get_running_loop()
+    bands = iter_text_bands(source)
+    next_band = lambda: next(bands, None)
+    band_future = loop.run_in_executor(None, next_band)
+    band_count = 0
+    try:
+        while True:
+            with metrics.phase("prepare"): band = await band_future
+            if band is None: break
+            band_future = loop.run_in_executor(None, next_band) # Render the next band meanwhile
+            band_count += 1
+            await begin_print_session(client, notifications, ae01_char, band.height, metrics)
+            await send_session_data(client, ae03_char, band.data, metrics, chunk_size=chunk_size, window=window)
+            if not await end_print_session(client, notifications, ae01_char, band.height, metrics):
+                print(f"Warning: AA notification not received for band {band_count}.")
+        await settle_after_job(metrics)
+        print(f"Print job for '{job_description}' sequence completed ({band_count} band(s), {metrics.rows} rows)."); return metrics.finish(True)
+    except Exception as e:
+        print(f"Error during print job for '{job_description}': {e}"); return metrics.finish(False)
+    finally:
+        try: await band_future # Don't leave the reading/rendering thread running on a failed job
+        except Exception: pass
+
+FEED_BLANK_DATA = bytes(PRINTER_WIDTH_BYTES * MAX_FEED_CHUNK_HEIGHT) # Shared by every feed chunk (0x00 = no dots)
+
+async def run_feed_paper(client, notifications, lines_to_feed, chunk_size=None, window=TRANSFER_WINDOW, metrics=None):
     """Sends commands to feed blank paper, handling chunking for large amounts."""
-    global received_responses
+    metrics = _new_metrics(client, "feed", f"Feed: {lines_to_feed} lines", metrics)
     print(f"Requested paper feed: {lines_to_feed} lines")
 
     total_lines_to_feed = lines_to_feed
-    if total_lines_to_feed <= 0: print("Error: Lines to feed must be positive."); return False
+    if total_lines_to_feed <= 0: print("Error: Lines to feed must be positive."); return metrics.finish(False)
 
     lines_remaining = total_lines_to_feed
     chunk_num = 0
@@ -452,77 +1558,31 @@ async def run_feed_paper(client, lines_to_feed):
         current_chunk_lines = min(lines_remaining, MAX_FEED_CHUNK_HEIGHT)
         print(f"\n--- Starting Feed Chunk {chunk_num}/{math.ceil(total_lines_to_feed/MAX_FEED_CHUNK_HEIGHT)} ({current_chunk_lines} lines) --- ")
 
-        # Prepare blank data for this chunk
+        # Blank data for this chunk: a view of the shared zero buffer, nothing is allocated
         blank_data_len = PRINTER_WIDTH_BYTES * current_chunk_lines
-        blank_data = bytes([0x00] * blank_data_len)
+        blank_data = memoryview(FEED_BLANK_DATA)[:blank_data_len]
 
-        try:
-            ae01_char = client.services.get_characteristic(CONTROL_WRITE_UUID)
-            ae02_char = client.services.get_characteristic(NOTIFY_UUID)
-            ae03_char = client.services.get_characteristic(DATA_WRITE_UUID)
-            if not all([ae01_char, ae02_char, ae03_char]): raise ValueError("Missing required GATT characteristic")
+        try: ae01_char, ae03_char = get_printer_characteristics(client)
         except Exception as e: print(f"Error getting characteristics: {e}"); overall_success = False; break
 
-        # --- Define Commands for this Chunk --- 
-        cmd_setup_b1 = create_command_with_crc(0xB1, bytes([0x00]))
-        cmd_setup_a2_1 = create_command_with_crc(0xA2, bytes([0x5D]))
-        cmd_setup_a1_1 = create_command_with_crc(0xA1, bytes([0x00]))
-        cmd_setup_a2_2 = create_command_with_crc(0xA2, bytes([0x5D]))
-        # A9 declares height for this specific feed chunk
-        feed_height_le = current_chunk_lines.to_bytes(2, 'little') 
-        width_bytes_le = PRINTER_WIDTH_BYTES.to_bytes(2, 'little')
-        print_request_data = feed_height_le + width_bytes_le
-        cmd_feed_request_a9 = create_command_simple(0xA9, print_request_data)
-        # AD signals end of data for this chunk
-        end_print_data = bytes([0x00]) 
-        cmd_end_feed_ad = create_command_simple(0xAD, end_print_data)
-
         # --- Send Commands + Blank Data for Chunk --- 
         chunk_success = False
         try:
-            # 1. Setup Sequence (B1, A2, A1) -> Wait/Check A1
-            async with notification_condition: received_responses.pop(0xA1, None)
-            for cmd in [cmd_setup_b1, cmd_setup_a2_1, cmd_setup_a1_1]:
-                await client.write_gatt_char(ae01_char.uuid, cmd, response=False); await asyncio.sleep(0.01)
-            async with notification_condition:
-                try: await asyncio.wait_for(notification_condition.wait_for(lambda: 0xA1 in received_responses), timeout=7.0)
-                except asyncio.TimeoutError: raise ValueError("Timeout waiting for A1 response")
-                if not check_a1_status(received_responses.pop(0xA1)): raise ValueError("A1 status check failed")
-
-            # 2. Feed Request Sequence (A2, A9) -> Wait/Check A9
-            async with notification_condition: received_responses.pop(0xA9, None)
-            for cmd in [cmd_setup_a2_2, cmd_feed_request_a9]: 
-                await client.write_gatt_char(ae01_char.uuid, cmd, response=False); await asyncio.sleep(0.01)
-            async with notification_condition:
-                try: await asyncio.wait_for(notification_condition.wait_for(lambda: 0xA9 in received_responses), timeout=7.0)
-                except asyncio.TimeoutError: raise ValueError("Timeout waiting for A9 response")
-                if not check_a9_status(received_responses.pop(0xA9)): raise ValueError("A9 status check failed")
+            # 1-2. Setup and Feed Request Sequences (A9 declares height for this specific feed chunk)
+            await begin_print_session(client, notifications, ae01_char, current_chunk_lines, metrics)
 
             # 3. Send Blank Data (AE03)
             print(f"  Sending chunk blank data ({blank_data_len} bytes) to {DATA_WRITE_UUID[-12:-8]}...")
-            max_chunk = 20
-            for j in range(0, len(blank_data), max_chunk):
-                chunk = blank_data[j:j + max_chunk]
-                await client.write_gatt_char(ae03_char.uuid, chunk, response=False)
+            await send_session_data(client, ae03_char, blank_data, metrics, chunk_size=chunk_size, window=window)
             print("  Finished sending chunk blank data.")
 
-            # 4. Send End Feed Command (AD) -> Wait/Check AA
-            async with notification_condition: received_responses.pop(0xAA, None)
-            await client.write_gatt_char(ae01_char.uuid, cmd_end_feed_ad, response=False)
-            await asyncio.sleep(0.01)
-
-            # Wait for AA notification (feed chunk finished)
+            # 4. Send End Feed Command (AD) -> Wait/Check AA (feed chunk finished)
             print("  Waiting for AA (Chunk Feed Complete)...")
-            async with notification_condition:
-                try:
-                     timeout_feed_chunk = max(15.0, current_chunk_lines / 20.0) # Rough estimate
-                     await asyncio.wait_for(notification_condition.wait_for(lambda: 0xAA in received_responses), timeout=timeout_feed_chunk)
-                     payload = received_responses.pop(0xAA)
-                     print("    AA notification received.")
-                     chunk_success = True
-                except asyncio.TimeoutError:
-                     print(f"  Warning: AA notification not received for feed chunk {chunk_num}.")
-            await asyncio.sleep(0.5)
+            if await end_print_session(client, notifications, ae01_char, current_chunk_lines, metrics, kind="feed"):
+                print("    AA notification received.")
+                chunk_success = True
+            else:
+                print(f"  Warning: AA notification not received for feed chunk {chunk_num}.")
 
         except Exception as e:
              print(f"Error during feed chunk {chunk_num}: {e}")
@@ -535,30 +1595,146 @@ async def run_feed_paper(client, lines_to_feed):
 
         # Update remaining lines and pause if necessary
         lines_remaining -= current_chunk_lines
+        # AA means the paper stopped, so the next chunk's handshake starts right away
         print(f"--- Feed Chunk {chunk_num} Complete. Lines remaining: {lines_remaining} ---")
-        if lines_remaining > 0:
-             print(f"--- Waiting {DELAY_BETWEEN_PRINTS}s before next feed chunk ---")
-             await asyncio.sleep(DELAY_BETWEEN_PRINTS)
 
     # --- End of Feed Loop --- 
     if overall_success:
         print(f"\nTotal requested feed ({total_lines_to_feed} lines) sequence complete.")
     else:
         print(f"\nFeed sequence failed or was incomplete.")
-    return overall_success
+    return metrics.finish(overall_success)
+# ---------------------------------
+
+# --- Printer Discovery ---
+DEVICE_CACHE_PATH = os.path.join(CACHE_DIR, 'devices.json')
+DEVICE_CACHE_VERSION = 1
+PRINTER_SERVICE_UUIDS = ("0000ae30-0000-1000-8000-00805f9b34fb", "0000af30-0000-1000-8000-00805f9b34fb") # Advertised by MXW01 units
+PRINTER_NAME_PREFIXES = ("MXW01", "MX01W") # Fallback when a printer doesn't advertise its service
+SCAN_TIMEOUT = 10.0 # Seconds to look for a printer
+CONNECT_TIMEOUT = 20.0
+CACHED_CONNECT_TIMEOUT = 8.0 # A cached printer that doesn't answer this fast is looked up again by scanning
+_discovered_devices = {} # Address -> BLEDevice seen by this process; connecting to it skips bleak's own scan
+
+def load_device_cache():
+    """Loads the cache of known printers: {"last": address, "devices": {address: {...}}}."""
+    try:
+        with open(DEVICE_CACHE_PATH) as f: cache = json.load(f)
+        if cache.get("version") == DEVICE_CACHE_VERSION: return cache
+    except (OSError, ValueError): pass
+    return {"version": DEVICE_CACHE_VERSION, "last": None, "devices": {}}
+
+def save_device_cache(cache):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f: json.dump(cache, f, indent=1)
+        os.replace(tmp_path, DEVICE_CACHE_PATH)
+    except OSError as e: print(f"Warning: Could not save printer cache: {e}")
+
+def remember_printer(client, name=None):
+    """Records a connected printer and its GATT layout as the one to try first next time."""
+    ae01_char = client.services.get_characteristic(CONTROL_WRITE_UUID)
+    cache = load_device_cache()
+    entry = cache["devices"].setdefault(client.address, {})
+    entry.update({"last_connected": time.time(), "service_uuid": getattr(ae01_char, 'service_uuid', None)})
+    if name: entry["name"] = name
+    cache["last"] = client.address
+    save_device_cache(cache)
+
+def is_printer_advertisement(device, advertisement):
+    """True if an advertisement looks like an MXW01 printer (service UUID or, failing that, name)."""
+    if any(uuid.lower() in PRINTER_SERVICE_UUIDS for uuid in (advertisement.service_uuids or [])): return True
+    name = advertisement.local_name or device.name or ""
+    return name.upper().startswith(PRINTER_NAME_PREFIXES)
+
+async def discover_printers(timeout=SCAN_TIMEOUT):
+    """Scans for nearby printers and returns [(BLEDevice, AdvertisementData)], strongest signal first."""
+    from bleak import BleakScanner
+    found = await BleakScanner.discover(timeout=timeout, return_adv=True)
+    printers = [(device, adv) for device, adv in found.values() if is_printer_advertisement(device, adv)]
+    for device, _ in printers: _discovered_devices[device.address] = device
+    return sorted(printers, key=lambda item: item[1].rssi, reverse=True)
+
+async def find_printer(timeout=SCAN_TIMEOUT):
+    """Scans until the first printer shows up and returns its BLEDevice (or None)."""
+    from bleak import BleakScanner
+    print(f"Scanning for printers (up to {timeout:g}s)...")
+    device = await BleakScanner.find_device_by_filter(is_printer_advertisement, timeout=timeout)
+    if device is not None:
+        _discovered_devices[device.address] = device
+        print(f"Found printer {device.name or ''} at {device.address}")
+    return device
+
+async def list_printers():
+    print(f"Scanning for printers ({SCAN_TIMEOUT:g}s)...")
+    printers = await discover_printers()
+    if not printers: print("No printers found."); return
+    last = load_device_cache().get("last")
+    for device, adv in printers:
+        marker = " (last used)" if device.address == last else ""
+        print(f"  {device.address}  {adv.local_name or device.name or '?':<12} RSSI {adv.rssi} dBm{marker}")
+
+async def _connect(BleakClient, target, timeout, disconnected_callback, cache):
+    """Connects to an address or BLEDevice, limiting service discovery to the cached printer service."""
+    address = getattr(target, 'address', target)
+    kwargs = {}
+    service_uuid = cache["devices"].get(address, {}).get("service_uuid")
+    if service_uuid: kwargs["services"] = [service_uuid] # Skip discovering the printer's other services
+    client = BleakClient(_discovered_devices.get(address, target), timeout=timeout, disconnected_callback=disconnected_callback, **kwargs)
+    await client.connect()
+    try: get_printer_characteristics(client)
+    except ValueError:
+        await client.disconnect()
+        if service_uuid: # Stale layout; forget it and retry with full discovery
+            cache["devices"][address].pop("service_uuid", None)
+            return await _connect(BleakClient, target, timeout, disconnected_callback, cache)
+        raise ValueError(f"{address} is not an MXW01 printer (AE01/AE02/AE03 missing)")
+    return client
+
+@contextlib.asynccontextmanager
+async def connect_printer(args, address=None, disconnected_callback=None):
+    """Connects to the printer and disconnects on exit.
+
+    Uses `address` (or -d) when given. Otherwise the printer cached from the last run is tried
+    first with a short timeout, then a scan looks for one, then DEFAULT_ADDRESS is used.
+    """
+    BleakClient = get_client_factory(args)
+    address = address or args.device
+    if getattr(args, 'simulate', False): # Nothing to scan for or cache
+        candidates = [(address or DEFAULT_ADDRESS, CONNECT_TIMEOUT)]
+        cache = {"devices": {}}
+    else:
+        cache = load_device_cache()
+        if address: candidates = [(address, CONNECT_TIMEOUT)]
+        else: candidates = [(cache["last"], CACHED_CONNECT_TIMEOUT)] if cache.get("last") else []
+    client, last_error = None, None
+    for target, timeout in candidates:
+        print(f"Attempting to connect to printer at {target}...")
+        try: client = await _connect(BleakClient, target, timeout, disconnected_callback, cache); break
+        except Exception as e: last_error = e; print(f"Could not connect to {target}: {e}")
+    if client is None and not address and not getattr(args, 'simulate', False):
+        target = await find_printer()
+        if target is None: print(f"No printer found by scanning; trying {DEFAULT_ADDRESS}."); target = DEFAULT_ADDRESS
+        print(f"Attempting to connect to printer at {getattr(target, 'address', target)}...")
+        client = await _connect(BleakClient, target, CONNECT_TIMEOUT, disconnected_callback, cache)
+    if client is None: raise last_error
+    if not getattr(args, 'simulate', False): remember_printer(client, getattr(_discovered_devices.get(client.address), 'name', None))
+    try: yield client
+    finally: await client.disconnect()
 # ---------------------------------
 
 # --- Script Logic ---
 def validate_args(args):
     """Checks for conflicting or missing command line arguments."""
-    is_print_action_specified = bool(args.image or args.folder or args.text)
+    is_print_action_specified = bool(args.image or args.folder or args.text or getattr(args, 'template', None) or getattr(args, 'text_file', None))
     is_feed_action_specified = args.feed is not None
     is_test_action_specified = args.test_print
     
     action_count = sum([is_print_action_specified, is_feed_action_specified, is_test_action_specified])
 
     if action_count == 0:
-        print("Error: No action specified. Use -i, -f, -t, -p, or -x.")
+        print("Error: No action specified. Use -i, -f, -t, --text-file, --template, -p, or -x.")
         return False
         
     if is_feed_action_specified and (is_print_action_specified or is_test_action_specified):
@@ -568,12 +1744,222 @@ def validate_args(args):
     if is_test_action_specified and (is_print_action_specified or is_feed_action_specified):
         print("Error: -x cannot be used with image/folder/text arguments or -p.")
         return False
+
+    if getattr(args, 'feed_after', None) is not None:
+        if is_feed_action_specified: print("Error: --feed-after cannot be used with -p."); return False
+        if args.feed_after <= 0: print("Error: --feed-after must be a positive number of lines."); return False
+
+    if getattr(args, 'text_file', None) and args.upside_down:
+        print("Error: --text-file is printed as it is read and can't be printed upside down.")
+        return False
+
+    if (getattr(args, 'field', None) or getattr(args, 'template_data', None)) and not getattr(args, 'template', None):
+        print("Error: --field and --template-data require --template.")
+        return False
+    try: parse_template_fields(getattr(args, 'field', None))
+    except ValueError as e: print(f"Error: {e}"); return False
+
+    if getattr(args, 'farm', None) and is_feed_action_specified:
+        print("Error: --farm cannot be used with -p.")
+        return False
+    if getattr(args, 'farm', None) and getattr(args, 'batch', False):
+        # Batching merges the jobs into a few sessions before the farm could spread them out
+        print("Error: --farm cannot be used with --batch.")
+        return False
+
+    if getattr(args, 'threshold', None) is not None and not 0 <= args.threshold <= 255:
+        print("Error: --threshold must be a gray level between 0 and 255.")
+        return False
+
+    if getattr(args, 'cache_size', None) is not None and args.cache_size < 0:
+        print("Error: --cache-size must be 0 (no cache) or more MB.")
+        return False
+
+    if getattr(args, 'workers', None) is not None and args.workers < 1:
+        print("Error: -w/--workers must be at least 1.")
+        return False
+
+    if getattr(args, 'chunk_size', None) is not None and not 1 <= args.chunk_size <= MAX_DATA_CHUNK_SIZE:
+        print(f"Error: --chunk-size must be between 1 and {MAX_DATA_CHUNK_SIZE} bytes.")
+        return False
+
+    if getattr(args, 'prefetch', None) is not None and args.prefetch < 1:
+        print("Error: --prefetch must be at least 1.")
+        return False
+
+    for option, value in (('--trim', getattr(args, 'trim', None)), ('--collapse-blank', getattr(args, 'collapse_blank', None))):
+        if value is not None and value < 0:
+            print(f"Error: {option} must be 0 or more rows.")
+            return False
+
+    if getattr(args, 'batch_gap', None) is not None and not 0 <= args.batch_gap < MAX_PRINT_HEIGHT:
+        print(f"Error: --batch-gap must be between 0 and {MAX_PRINT_HEIGHT - 1} rows.")
+        return False
         
     return True # Args are valid
 
-def prepare_print_jobs(args):
-    """Prepares a list of (image_object, description) tuples based on arguments."""
-    jobs = []
+def dither_args(args):
+    """(mode, threshold) selected by --dither and --threshold; the threshold only matters to its own mode."""
+    mode = getattr(args, 'dither', None) or DEFAULT_DITHER
+    threshold = getattr(args, 'threshold', None)
+    return mode, DEFAULT_THRESHOLD if threshold is None or mode != 'threshold' else threshold
+
+def decode_preset(args):
+    """The --decode preset, falling back to the default for requests from older --submit clients."""
+    return getattr(args, 'decode', None) or DEFAULT_DECODE
+
+def prepare_image_job(image_path, args):
+    """Prepares one image file as a print job: a PackedRaster, or a StreamImage with --stream."""
+    filename = os.path.basename(image_path)
+    if getattr(args, 'stream', False):
+        source = StreamImage(image_path, PRINTER_WIDTH_PIXELS, args.upside_down, *dither_args(args), decode_preset(args))
+        try: height = stream_image_height(source)
+        except Exception as e: print(f"Error loading image '{image_path}': {e}"); return None
+        print(f"Streaming '{filename}' ({height} rows, {STREAM_BAND_HEIGHT}-row bands)")
+        return source
+    img_raw = prepare_image_for_print(image_path, PRINTER_WIDTH_PIXELS, *dither_args(args), decode=decode_preset(args))
+    if img_raw and args.upside_down:
+        print(f"Rotating '{filename}' 180 degrees.")
+        img_raw = img_raw.rotate(180)
+    return pack_raster(img_raw) if img_raw else None
+
+def _prepare_image_worker(image_path, args):
+    """Worker entry point: prepares one image, reporting errors for that file instead of raising."""
+    try: return prepare_image_job(image_path, args)
+    except Exception as e: print(f"Error preparing image '{image_path}': {e}"); return None
+
+def iter_image_files(image_paths, args):
+    """Yields prepared image files in the order of image_paths, serving repeats from the raster cache.
+
+    Uncached files are prepared on a process pool (one file at a time without one), with at most
+    IMAGE_PREPARE_AHEAD files per worker in flight, so memory doesn't grow with the number of files.
+    With --stream only the image headers are read here, so they are opened in-process as needed.
+    """
+    from concurrent.futures import Future
+    stream = getattr(args, 'stream', False)
+    cache = None if stream else get_raster_cache(args)
+    workers = 1 if stream else min(getattr(args, 'workers', None) or os.cpu_count() or 1, len(image_paths))
+    pool = None
+    if workers > 1:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        print(f"Preparing {len(image_paths)} images on {workers} worker processes...")
+        # This usually runs on the JobPrefetcher thread; forking a process that has threads can deadlock
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        try: pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+        except OSError as e: print(f"Warning: Worker pool failed ({e}). Preparing images one at a time.")
+    pending = deque() # (image_path, cache key, cached raster or Future or None), in order
+
+    def start(image_path):
+        key = None
+        if cache is not None:
+            try: key = image_cache_key(image_path, args)
+            except OSError: pass # Unreadable file: let preparation report the error
+            raster = cache.get(key) if key is not None else None
+            if raster is not None:
+                print(f"Using cached raster for '{os.path.basename(image_path)}' ({raster.height} rows)")
+                return image_path, key, raster
+        return image_path, key, pool.submit(_prepare_image_worker, image_path, args) if pool is not None else None
+
+    def cancel_pending():
+        # Executor.shutdown(cancel_futures=True) would need Python 3.9
+        for _, _, result in pending:
+            if isinstance(result, Future): result.cancel()
+
+    def store(key, raster):
+        if cache is not None and key is not None and isinstance(raster, PackedRaster): cache.put(key, raster)
+        return raster
+
+    def finish(image_path, key, result):
+        nonlocal pool
+        if result is None: return store(key, _prepare_image_worker(image_path, args))
+        if not isinstance(result, Future): return result # Cache hit
+        from concurrent.futures import CancelledError
+        from concurrent.futures.process import BrokenProcessPool
+        try: return store(key, result.result())
+        except BrokenProcessPool as e:
+            if pool is not None:
+                print(f"Warning: Worker pool failed ({e}). Preparing images one at a time.")
+                cancel_pending(); pool.shutdown(wait=False); pool = None
+            return store(key, _prepare_image_worker(image_path, args))
+        except CancelledError: # Cancelled with the pool (shutdown or a broken pool); prepare it here
+            return store(key, _prepare_image_worker(image_path, args))
+
+    try:
+        for image_path in image_paths:
+            pending.append(start(image_path))
+            while len(pending) > workers * IMAGE_PREPARE_AHEAD: yield finish(*pending.popleft())
+        while pending: yield finish(*pending.popleft())
+    finally:
+        if pool is not None: cancel_pending(); pool.shutdown(wait=False)
+
+def prepare_image_files(image_paths, args):
+    """Prepares image files, serving repeats from the raster cache. Results keep the order of image_paths."""
+    return list(iter_image_files(image_paths, args))
+
+def prepare_text_job(text, font_name, font_size, alignment, args):
+    """Renders a text job to a PackedRaster, serving repeats from the raster cache."""
+    cache = get_raster_cache(args)
+    key = text_cache_key(text, font_name, font_size, alignment, args) if cache is not None else None
+    if key is not None:
+        raster = cache.get(key)
+        if raster is not None:
+            print(f"Using cached raster for text '{text[:25]}...' ({raster.height} rows)")
+            return raster
+    font = load_font(font_name, font_size) # Use helper
+    img_raw = create_text_bitmap(text, font, PRINTER_WIDTH_PIXELS, alignment=alignment)
+    if not img_raw: return None
+    if args.upside_down:
+        print("Rotating text 180 degrees.")
+        img_raw = img_raw.rotate(180)
+    raster = pack_raster(img_raw)
+    if key is not None: cache.put(key, raster)
+    return raster
+
+def parse_template_fields(field_args):
+    """Turns repeated --field NAME=VALUE arguments into a dict (raises ValueError on a bad entry)."""
+    fields = {}
+    for entry in field_args or []:
+        name, sep, value = entry.partition('=')
+        if not sep or not name: raise ValueError(f"--field expects NAME=VALUE, got '{entry}'")
+        fields[name] = value
+    return fields
+
+def iter_template_records(args):
+    """Yields the field dicts of a template run: one per --template-data row, or just the --field values."""
+    fields = parse_template_fields(args.field)
+    if not args.template_data: yield fields; return
+    with open(args.template_data, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            # Short rows fall back to the --field defaults
+            yield {**fields, **{k: v for k, v in row.items() if k is not None and v is not None}}
+
+def iter_template_jobs(args):
+    """Renders one PackedRaster per record of --template-data (or one from --field values), as they are read."""
+    try:
+        with open(args.template, encoding='utf-8') as f: source = f.read().rstrip('\n')
+    except OSError as e: print(f"Error reading template '{args.template}': {e}"); return
+    font = load_font(args.font, args.font_size)
+    try: template = TextTemplate(source, font, PRINTER_WIDTH_PIXELS, args.align)
+    except ValueError as e: print(f"Error in template '{args.template}': {e}"); return
+    name = os.path.basename(args.template)
+    print(f"Rendering template '{name}' (fields: {', '.join(sorted(template.fields)) or 'none'})...")
+    pages, render_time = 0, 0.0
+    try:
+        for number, record in enumerate(iter_template_records(args), 1):
+            start = time.perf_counter()
+            try: img = template.render(record)
+            except ValueError as e: print(f"  Error in record {number}: {e}"); continue
+            if args.upside_down: img = img.rotate(180)
+            raster = pack_raster(img)
+            render_time += time.perf_counter() - start
+            pages += 1
+            yield raster, f"Template: {name} #{number}"
+    except OSError as e: print(f"Error reading template data '{args.template_data}': {e}")
+    print(f"Rendered {pages} page(s) in {render_time:.2f}s")
+
+def iter_source_jobs(args):
+    """Yields (PackedRaster, StreamImage or StreamText, description) jobs for the requested actions, one at a time."""
     if args.test_print:
         print("--- Running Test Print Sequence ---")
         # 1. Test Images from standard folder
@@ -583,14 +1969,9 @@ def prepare_print_jobs(args):
                 file_list = sorted([f for f in os.listdir(TEST_IMAGE_FOLDER) if f.lower().endswith(SUPPORTED_EXTENSIONS)])
                 if not file_list: print(f"No supported image files found in '{TEST_IMAGE_FOLDER}'.")
                 else:
-                    for filename in file_list:
-                        image_path = os.path.join(TEST_IMAGE_FOLDER, filename)
-                        img_raw = prepare_image_for_print(image_path, PRINTER_WIDTH_PIXELS)
-                        if img_raw:
-                            if args.upside_down: 
-                                print(f"Rotating '{filename}' 180 degrees.")
-                                img_raw = img_raw.rotate(180)
-                            jobs.append((img_raw, f"Test Img: {filename}"))
+                    image_paths = [os.path.join(TEST_IMAGE_FOLDER, filename) for filename in file_list]
+                    for filename, img_raw in zip(file_list, iter_image_files(image_paths, args)):
+                        if img_raw: yield img_raw, f"Test Img: {filename}"
             except Exception as e: print(f"Error processing test image folder '{TEST_IMAGE_FOLDER}': {e}")
         else:
             print(f"Warning: Test image folder '{TEST_IMAGE_FOLDER}' not found. Skipping image tests.")
@@ -599,24 +1980,16 @@ def prepare_print_jobs(args):
         print("Preparing test text jobs...")
         for text, font_name, font_size in TEST_TEXT_JOBS:
             print(f"  Preparing text: '{text[:40]}...' (Font: {font_name}, Size: {font_size})")
-            font = load_font(font_name, font_size) # Use helper
-            img_raw = create_text_bitmap(text, font, PRINTER_WIDTH_PIXELS)
+            img_raw = prepare_text_job(text, font_name, font_size, 'left', args)
             if img_raw:
-                 if args.upside_down: 
-                     print("    Rotating text 180 degrees.")
-                     img_raw = img_raw.rotate(180)
-                 jobs.append((img_raw, f"Test Txt: {text[:30]}..."))
+                 yield img_raw, f"Test Txt: {text[:30]}..."
             else: print(f"    Error: Could not generate bitmap for text: {text[:30]}...")
         print("--- Test Print Sequence Prepared ---")
             
     else: # Normal print actions (image, folder, text can be combined)
         if args.image:
-            img_raw = prepare_image_for_print(args.image, PRINTER_WIDTH_PIXELS)
-            if img_raw:
-                if args.upside_down: 
-                    print("Rotating image 180 degrees.")
-                    img_raw = img_raw.rotate(180)
-                jobs.append((img_raw, os.path.basename(args.image)))
+            img_raw = prepare_image_files([args.image], args)[0]
+            if img_raw: yield img_raw, os.path.basename(args.image)
         
         if args.folder:
             if not os.path.isdir(args.folder): print(f"Error: Folder not found: {args.folder}")
@@ -626,64 +1999,249 @@ def prepare_print_jobs(args):
                     file_list = sorted([f for f in os.listdir(args.folder) if f.lower().endswith(SUPPORTED_EXTENSIONS)])
                     if not file_list: print(f"No supported image files found in '{args.folder}'.")
                     else:
-                        for filename in file_list:
-                            image_path = os.path.join(args.folder, filename)
-                            img_raw = prepare_image_for_print(image_path, PRINTER_WIDTH_PIXELS)
-                            if img_raw:
-                                if args.upside_down: 
-                                    print(f"Rotating '{filename}' 180 degrees.")
-                                    img_raw = img_raw.rotate(180)
-                                jobs.append((img_raw, filename))
+                        image_paths = [os.path.join(args.folder, filename) for filename in file_list]
+                        for filename, img_raw in zip(file_list, iter_image_files(image_paths, args)):
+                            if img_raw: yield img_raw, filename
                 except Exception as e: print(f"Error processing folder '{args.folder}': {e}")
 
         if args.text:
-            # Use the font specified on the command line
-            font = load_font(args.font, args.font_size)
-            # Pass alignment to the bitmap creation function
-            img_raw = create_text_bitmap(args.text, font, PRINTER_WIDTH_PIXELS, alignment=args.align)
+            # Use the font and alignment specified on the command line
+            img_raw = prepare_text_job(args.text, args.font, args.font_size, args.align, args)
             if img_raw:
-                 if args.upside_down:
-                     print("Rotating text 180 degrees.")
-                     img_raw = img_raw.rotate(180)
                  # Update job description to include alignment
-                 jobs.append((img_raw, f"Text: '{args.text[:25]}...' (Font: {args.font}, Size: {args.font_size}, Align: {args.align})"))
-                 
+                 yield img_raw, f"Text: '{args.text[:25]}...' (Font: {args.font}, Size: {args.font_size}, Align: {args.align})"
+
+        if getattr(args, 'template', None):
+            yield from iter_template_jobs(args)
+
+        if getattr(args, 'text_file', None):
+            if args.text_file != '-' and not os.path.isfile(args.text_file): print(f"Error: Text file not found: {args.text_file}")
+            else:
+                name = "stdin" if args.text_file == '-' else os.path.basename(args.text_file)
+                print(f"Streaming text from {name} ({TEXT_STREAM_BAND_LINES}-line bands)")
+                yield StreamText(args.text_file, args.font, args.font_size, args.align), f"Text file: {name}"
+
+    cache = get_raster_cache(args)
+    if cache is not None and (cache.hits or cache.misses): print(f"Raster cache: {cache.stats()}")
+
+def iter_print_jobs(args):
+    """Yields the (raster, description) print jobs for args lazily, through trimming, batching and --feed-after.
+
+    Each job is prepared only when it is asked for, so a print run holds the jobs that are printing
+    or prefetched (see JobPrefetcher) rather than the whole run.
+    """
+    jobs = iter_source_jobs(args)
+    if getattr(args, 'trim', None) is not None or getattr(args, 'collapse_blank', None) is not None:
+        jobs = trim_print_jobs(jobs, args.trim, args.collapse_blank)
+    if getattr(args, 'batch', False):
+        jobs = batch_print_jobs(jobs, args.batch_gap or 0)
+    if getattr(args, 'feed_after', None):
+        jobs = append_feed_rows(jobs, args.feed_after)
     return jobs
 
+def prepare_print_jobs(args):
+    """Prepares a list of (PackedRaster or StreamImage, description) tuples based on arguments."""
+    return list(iter_print_jobs(args))
+
+def trim_print_jobs(jobs, margin=None, max_gap=None):
+    """Applies trim_raster to every prepared raster and reports the rows saved per job.
+
+    Streamed jobs are passed through unchanged, since their rows are only produced while printing.
+    """
+    total = 0
+    for raster, description in jobs:
+        if not isinstance(raster, (StreamImage, StreamText, FeedJob)):
+            if not isinstance(raster, PackedRaster): raster = pack_raster(raster)
+            raster, removed = trim_raster(raster, margin, max_gap)
+            if removed:
+                print(f"Trimmed {removed} blank row(s) from '{description}' ({raster.height + removed} -> {raster.height} rows)")
+                total += removed
+        yield raster, description
+    if total: print(f"Blank row trimming: {total} row(s) saved ({total * PRINTER_WIDTH_BYTES} bytes less to send).")
+
+def append_feed_rows(jobs, lines):
+    """Feeds `lines` blank rows after the last job by appending them to its raster.
+
+    The rows then print in the same session as the job, with no extra handshake. When the last
+    job is streamed or the rows would exceed MAX_PRINT_HEIGHT, a separate FeedJob is queued instead.
+    """
+    last = None
+    for job in jobs:
+        if last is not None: yield last
+        last = job
+    if last is None: return
+    raster, description = last
+    if not isinstance(raster, (StreamImage, StreamText, FeedJob)):
+        if not isinstance(raster, PackedRaster): raster = pack_raster(raster)
+        if raster.height + lines <= MAX_PRINT_HEIGHT:
+            yield PackedRaster(raster.data + bytes(PRINTER_WIDTH_BYTES * lines), raster.height + lines), f"{description} + feed {lines}"
+            return
+    yield raster, description
+    yield FeedJob(lines), f"Feed: {lines} lines"
+
+def batch_print_jobs(jobs, gap_rows=DEFAULT_BATCH_GAP):
+    """Merges consecutive jobs into as few print sessions as possible.
+
+    Rasters are stacked, with `gap_rows` blank rows between them, into PackedRasters of at most
+    MAX_PRINT_HEIGHT rows, so each group needs one handshake, one AA wait and no pauses.
+    Streamed images and rasters that are too tall on their own are kept as separate jobs.
+    Jobs are read and merged groups yielded as they fill up.
+    """
+    gap = bytes(PRINTER_WIDTH_BYTES * gap_rows) # Packed 0x00 = no dots, as in a paper feed
+    group, descriptions, group_height = bytearray(), [], 0
+    job_count = session_count = 0
+
+    def take_group():
+        """Returns the stacked group as one job (None if empty) and starts a new group."""
+        nonlocal group, descriptions, group_height
+        if not descriptions: return None
+        description = descriptions[0] if len(descriptions) == 1 else f"Batch of {len(descriptions)}: {', '.join(descriptions)}"
+        job = (PackedRaster(bytes(group), group_height), description)
+        group, descriptions, group_height = bytearray(), [], 0
+        return job
+
+    for raster, description in jobs:
+        job_count += 1
+        if not isinstance(raster, (StreamImage, StreamText, PackedRaster)): raster = pack_raster(raster)
+        if isinstance(raster, (StreamImage, StreamText)) or raster.height > MAX_PRINT_HEIGHT:
+            merged = take_group()
+            if merged: session_count += 1; yield merged
+            session_count += 1; yield raster, description
+            continue
+        if descriptions and group_height + gap_rows + raster.height > MAX_PRINT_HEIGHT: session_count += 1; yield take_group()
+        if descriptions: group += gap; group_height += gap_rows
+        group += raster.data; group_height += raster.height
+        descriptions.append(description)
+    merged = take_group()
+    if merged: session_count += 1; yield merged
+    if session_count < job_count: print(f"Batch mode: {job_count} job(s) merged into {session_count} print session(s).")
+
+class JobPrefetcher:
+    """Async iterator over print jobs that prepares up to `depth` jobs ahead on a worker thread.
+
+    The job iterator (usually iter_print_jobs) only runs on that one thread, so preparing the next
+    jobs overlaps with printing the current one and at most `depth` prepared jobs wait in memory.
+    """
+    def __init__(self, jobs, depth=DEFAULT_PREFETCH):
+        self._jobs = iter(jobs)
+        self.depth = max(1, depth)
+        self.count = 0 # Jobs handed out so far
+        self.finished = 0 # Jobs print_jobs got through (printed, or failed with the link still up)
+        self._pending = deque() # Futures of next(jobs), in order
+        self._executor = None
+        self._closed = False
+
+    def start(self):
+        """Starts (or tops up) preparation in the background; needs a running event loop."""
+        if self._closed: return
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mxw01-prepare")
+        loop = asyncio.get_running_loop()
+        while len(self._pending) < self.depth:
+            self._pending.append(loop.run_in_executor(self._executor, next, self._jobs, None))
+
+    async def has_next(self):
+        """Waits for the next job to be prepared and returns whether there is one."""
+        if self._closed: return False
+        self.start()
+        return await self._pending[0] is not None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed: raise StopAsyncIteration
+        self.start()
+        job = await self._pending.popleft()
+        if job is None: self.close(); raise StopAsyncIteration
+        self.count += 1
+        self.start()
+        return job
+
+    def close(self):
+        """Stops preparing further jobs (the one being prepared is finished in the background)."""
+        self._closed = True
+        for future in self._pending: future.cancel() # Also cancels the executor job if it hasn't started
+        self._pending.clear()
+        if self._executor is not None: self._executor.shutdown(wait=False)
+
+async def print_jobs(client, notifications, jobs_to_print, args):
+    """Prints (raster, description) jobs on a connected client. Returns True if all succeeded.
+
+    jobs_to_print is a list, any iterable of jobs (prepared lazily, --prefetch jobs ahead) or a
+    JobPrefetcher that is already running. Stops as soon as the link is lost; the prefetcher's
+    `finished` count then tells which job to resume from.
+    """
+    total = len(jobs_to_print) if isinstance(jobs_to_print, (list, tuple)) else None
+    jobs = jobs_to_print if isinstance(jobs_to_print, JobPrefetcher) else JobPrefetcher(jobs_to_print, getattr(args, 'prefetch', None) or DEFAULT_PREFETCH)
+    print("\nStarting print jobs...")
+    all_jobs_succeeded = True 
+    try:
+        async for img_to_print, job_desc in jobs:
+            print(f"\n--- Starting Print Job {jobs.count}{f'/{total}' if total else ''} --- ")
+            metrics = JobMetrics(job_kind(img_to_print), job_desc, client.address)
+            success = await run_print_job(client, notifications, img_to_print, job_desc, chunk_size=args.chunk_size, window=args.window, metrics=metrics)
+            # Pause between jobs if more are coming, unless AA already said the printer is done (counted as this job's delay)
+            if client.is_connected and not metrics.printer_ready and await jobs.has_next():
+                print(f"--- Waiting {DELAY_BETWEEN_PRINTS}s before next job ---")
+                await metrics.sleep(DELAY_BETWEEN_PRINTS)
+                metrics.finish(success)
+            record_job_metrics(metrics)
+            if not success:
+                all_jobs_succeeded = False
+            if success or client.is_connected: jobs.finished += 1
+            if not client.is_connected:
+                print("Printer link lost; not sending the remaining jobs.")
+                return False
+    finally:
+        jobs.close()
+    return all_jobs_succeeded
+
+async def feed_paper(client, notifications, lines_to_feed, args, metrics=None):
+    """run_feed_paper() with the transfer options from args; records the feed's metrics."""
+    metrics = metrics or JobMetrics("feed", f"Feed: {lines_to_feed} lines", client.address)
+    success = await run_feed_paper(client, notifications, lines_to_feed, chunk_size=args.chunk_size, window=args.window, metrics=metrics)
+    record_job_metrics(metrics)
+    return success
+
 async def main(args):
     """Main orchestration function."""
-    target_address = args.device if args.device else DEFAULT_ADDRESS
-
     # 1. Validate Arguments
     if not validate_args(args):
         sys.exit(1)
+    configure_metrics(args)
+    configure_speed_model(args)
 
     # 2. Handle Feed Action (if specified, then exit)
     if args.feed is not None:
         lines_to_feed = args.feed
         print(f"Feed paper mode selected: {lines_to_feed} lines")
-        print(f"Attempting to connect to printer at {target_address}...")
+        bluetooth_errors = get_bluetooth_errors(args)
         try:
-            async with BleakClient(target_address, timeout=20.0) as client:
+            async with connect_printer(args) as client:
                 if not client.is_connected: print("Failed to connect."); sys.exit(1)
                 print(f"Connected to {client.address}")
-                try: await client.start_notify(NOTIFY_UUID, notification_handler)
+                notifications = NotificationDispatcher()
+                try: await notifications.start(client)
                 except Exception as e: print(f"Error enabling notifications: {e}"); sys.exit(1)
-                success = await run_feed_paper(client, lines_to_feed)
-                await asyncio.sleep(1.0) 
+                metrics = JobMetrics("feed", f"Feed: {lines_to_feed} lines", client.address)
+                success = await feed_paper(client, notifications, lines_to_feed, args, metrics=metrics)
+                if not metrics.printer_ready: await asyncio.sleep(DISCONNECT_GRACE) # No AA, so the paper may still be moving
                 print("Stopping notifications..."); await client.stop_notify(NOTIFY_UUID)
                 print("Disconnected.")
                 sys.exit(0 if success else 1)
-        except BleakError as e: print(f"Bluetooth Error: {e}"); sys.exit(1)
+        except bluetooth_errors as e: print(f"Bluetooth Error: {e}"); sys.exit(1)
         except asyncio.TimeoutError: print("Connection timed out."); sys.exit(1)
         except Exception as e: print(f"An unexpected error occurred: {e}"); sys.exit(1)
     
-    # 3. Prepare Print Jobs (test mode or normal)
-    jobs_to_print = prepare_print_jobs(args)
-    if not jobs_to_print:
+    # 3. Prepare Print Jobs lazily (test mode or normal); the first one up front so bad input fails before connecting
+    jobs_to_print = iter_print_jobs(args)
+    first_job = next(jobs_to_print, None)
+    if first_job is None:
         print("Error: No valid print jobs could be prepared. Exiting.")
         sys.exit(1)
-    print(f"\nTotal print jobs prepared: {len(jobs_to_print)}")
+    jobs_to_print = itertools.chain([first_job], jobs_to_print)
 
     # 4. Handle Debug Save (if specified, then exit)
     if args.debug_save:
@@ -691,7 +2249,7 @@ async def main(args):
         if not os.path.exists("debug_output"): 
             try: os.makedirs("debug_output")
             except OSError as e: print(f"Error creating debug_output directory: {e}"); sys.exit(1)
-        print(f"Saving {len(jobs_to_print)} prepared job(s) to 'debug_output/'...")
+        print("Saving prepared jobs to 'debug_output/'...")
         for i, (img_to_save, job_desc) in enumerate(jobs_to_print):
             # Create a safe filename from the description
             safe_desc = "".join(c if c.isalnum() or c in ('_', '-', '.') else '_' for c in job_desc)
@@ -705,6 +2263,10 @@ async def main(args):
             suffix = "_rotated" if args.upside_down else ""
             filename = os.path.join("debug_output", f"debug_{i:02d}_{safe_desc}{suffix}.png")
             try:
+                if isinstance(img_to_save, StreamImage): img_to_save = stream_image_to_bitmap(img_to_save)
+                elif isinstance(img_to_save, StreamText): img_to_save = stream_text_to_bitmap(img_to_save)
+                elif isinstance(img_to_save, PackedRaster): img_to_save = packed_to_image(*img_to_save)
+                elif isinstance(img_to_save, FeedJob): img_to_save = packed_to_image(bytes(PRINTER_WIDTH_BYTES * img_to_save.lines), img_to_save.lines)
                 img_to_save.save(filename)
                 print(f"  Saved: {filename}")
             except Exception as e: print(f"  Error saving {filename}: {e}")
@@ -712,37 +2274,32 @@ async def main(args):
         sys.exit(0) 
         
     # 5. Connect and Print Loop
-    print(f"Attempting to connect to printer at {target_address}...")
+    if args.farm:
+        if not await run_farm(args.farm, list(jobs_to_print), args):
+            print("Exiting with error status due to connection/print failure."); sys.exit(1)
+        print("Exiting successfully."); sys.exit(0)
+    bluetooth_errors = get_bluetooth_errors(args)
     overall_success = False # Assume failure unless all jobs succeed
+    jobs_to_print = JobPrefetcher(jobs_to_print, args.prefetch)
+    jobs_to_print.start() # The next jobs are prepared while connecting
     try:
-        async with BleakClient(target_address, timeout=20.0) as client:
+        async with connect_printer(args) as client:
             if not client.is_connected: print("Failed to connect."); sys.exit(1)
             print(f"Connected to {client.address}")
-            try: await client.start_notify(NOTIFY_UUID, notification_handler)
+            notifications = NotificationDispatcher()
+            try: await notifications.start(client)
             except Exception as e: print(f"Error enabling notifications: {e}"); sys.exit(1)
 
-            print("\nStarting print jobs...")
-            all_jobs_succeeded = True 
-            for i, (img_to_print, job_desc) in enumerate(jobs_to_print):
-                print(f"\n--- Starting Print Job {i+1}/{len(jobs_to_print)} --- ")
-                success = await run_print_job(client, img_to_print, job_desc)
-                if not success:
-                    all_jobs_succeeded = False
-                                
-                # Pause between jobs if more are coming
-                if i < len(jobs_to_print) - 1: 
-                    print(f"--- Waiting {DELAY_BETWEEN_PRINTS}s before next job ---")
-                    await asyncio.sleep(DELAY_BETWEEN_PRINTS)
-            
-            overall_success = all_jobs_succeeded
-            print("\nAll print jobs processed.")
-            await asyncio.sleep(1.0) # Short pause before disconnect
+            overall_success = await print_jobs(client, notifications, jobs_to_print, args)
+            print(f"\nAll print jobs processed ({jobs_to_print.count}).")
+            # No pause before disconnecting: AA means the printer is done, and run_print_job already pauses when AA timed out
             print("Stopping notifications..."); await client.stop_notify(NOTIFY_UUID)
             print("Disconnected.")
 
-    except BleakError as e: print(f"Bluetooth Error: {e}")
+    except bluetooth_errors as e: print(f"Bluetooth Error: {e}")
     except asyncio.TimeoutError: print("Connection timed out.")
     except Exception as e: print(f"An unexpected error occurred: {e}")
+    finally: jobs_to_print.close()
     
     # Exit with appropriate code
     if not overall_success: 
@@ -752,15 +2309,273 @@ async def main(args):
         print("Exiting successfully.")
         sys.exit(0)
 
+# --- Print Farm ---
+FARM_MAX_ATTEMPTS = 3 # Tries a job gets (on any printers) before it counts as failed
+FARM_MAX_PRINTER_FAILURES = 2 # Consecutive failed jobs after which a printer is retired
+
+class FarmPrinter:
+    """One printer of a farm and the results it reported."""
+    def __init__(self, address):
+        self.address = address
+        self.printed = []
+        self.failed = []
+        self.retired = None # Reason the printer stopped taking jobs
+
+    def report(self):
+        state = f"retired ({self.retired})" if self.retired else "ok"
+        return f"  {self.address}: {len(self.printed)} printed, {len(self.failed)} failed, {state}"
+
+async def run_farm(addresses, jobs_to_print, args):
+    """Prints jobs on several printers at once, each taking the next job whenever it is idle.
+
+    A failed job goes back to the queue for another try, up to FARM_MAX_ATTEMPTS tries. A printer that
+    loses its connection or fails FARM_MAX_PRINTER_FAILURES jobs in a row is retired and the remaining
+    printers carry on. Returns True if every job printed.
+    """
+    bluetooth_errors = get_bluetooth_errors(args)
+    queue = asyncio.Queue()
+    for index, (raster, description) in enumerate(jobs_to_print): queue.put_nowait((index, raster, description, 0))
+    printers = [FarmPrinter(address) for address in addresses]
+    outcome = {} # Job index -> address that printed it, or None if it failed everywhere
+    finished = asyncio.Event()
+    active = len(printers)
+
+    def settle(index, address):
+        outcome[index] = address
+        if len(outcome) == len(jobs_to_print): finished.set()
+
+    def requeue(printer, item):
+        index, raster, description, attempts = item
+        printer.failed.append(description)
+        if attempts + 1 < FARM_MAX_ATTEMPTS: queue.put_nowait((index, raster, description, attempts + 1))
+        else: print(f"[Farm] Giving up on '{description}' after {FARM_MAX_ATTEMPTS} attempts."); settle(index, None)
+
+    async def next_job():
+        get_task = asyncio.ensure_future(queue.get())
+        done_task = asyncio.ensure_future(finished.wait())
+        await asyncio.wait({get_task, done_task}, return_when=asyncio.FIRST_COMPLETED)
+        done_task.cancel()
+        if get_task.done(): return get_task.result()
+        get_task.cancel()
+        return None
+
+    async def work(printer):
+        nonlocal active
+        print(f"[Farm] Connecting to {printer.address}...")
+        item, failures = None, 0
+        try:
+            async with connect_printer(args, address=printer.address) as client:
+                notifications = NotificationDispatcher()
+                await notifications.start(client)
+                print(f"[Farm] {printer.address} connected.")
+                while True:
+                    item = await next_job()
+                    if item is None: break
+                    index, raster, description, attempts = item
+                    print(f"\n[Farm] {printer.address}: job {index + 1}/{len(jobs_to_print)} '{description}'")
+                    metrics = JobMetrics(job_kind(raster), description, printer.address)
+                    success = await run_print_job(client, notifications, raster, description, chunk_size=args.chunk_size, window=args.window, metrics=metrics)
+                    # A failed job goes back to the queue, so the printer needs the pause before the next one too
+                    if client.is_connected and not metrics.printer_ready and (not success or not queue.empty()):
+                        await metrics.sleep(DELAY_BETWEEN_PRINTS); metrics.finish(success)
+                    record_job_metrics(metrics)
+                    if success:
+                        printer.printed.append(description); settle(index, printer.address)
+                        item, failures = None, 0
+                    else:
+                        if not client.is_connected: printer.retired = "connection lost"; break
+                        failures += 1; requeue(printer, item); item = None
+                        if failures >= FARM_MAX_PRINTER_FAILURES: printer.retired = f"{failures} jobs failed in a row"; break
+        except bluetooth_errors + (asyncio.TimeoutError, OSError, ValueError) as e:
+            printer.retired = printer.retired or f"connection error: {e}"
+        if item is not None: requeue(printer, item) # Hand the interrupted job to the remaining printers
+        if printer.retired: print(f"[Farm] {printer.address} retired: {printer.retired}")
+        active -= 1
+        if active == 0: # Nobody left to print what is still queued
+            while not queue.empty(): settle(queue.get_nowait()[0], None)
+            finished.set()
+
+    print(f"\nStarting print farm: {len(jobs_to_print)} job(s) on {len(printers)} printer(s)...")
+    await asyncio.gather(*(work(printer) for printer in printers))
+    print("\n--- Print Farm Results ---")
+    for printer in printers: print(printer.report())
+    failed = [jobs_to_print[index][1] for index, address in sorted(outcome.items()) if address is None]
+    failed += [description for index, (_, description) in enumerate(jobs_to_print) if index not in outcome]
+    if failed: print(f"  Not printed: {', '.join(failed)}")
+    return not failed
+# ---------------------------------
+
+# --- Daemon Mode ---
+# Per-user runtime directory, so other users can't take over or spoof the socket (not world-writable /tmp)
+DEFAULT_SOCKET_PATH = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or CACHE_DIR, "mxw01print.sock")
+DAEMON_RECONNECT_MIN_DELAY = 0.5 # First reconnect attempt after a link loss comes this fast...
+DAEMON_RECONNECT_DELAY = 3.0 # ...then the wait doubles up to this many seconds
+# Arguments forwarded from a --submit client to the daemon
+DAEMON_JOB_ARGS = ('image', 'folder', 'text', 'feed', 'test_print', 'upside_down', 'font', 'font_size', 'align', 'stream', 'batch', 'batch_gap', 'feed_after',
+                   'dither', 'threshold', 'decode', 'trim', 'collapse_blank', 'template', 'field', 'template_data', 'text_file')
+
+def build_daemon_request(args):
+    """Builds the JSON-serializable job request a --submit client sends to the daemon."""
+    request = {key: getattr(args, key) for key in DAEMON_JOB_ARGS}
+    # The daemon may run from a different working directory
+    for key in ('image', 'folder', 'template', 'template_data', 'text_file'):
+        if request[key] and request[key] != '-': request[key] = os.path.abspath(request[key])
+    return request
+
+async def submit_to_daemon(args):
+    """Sends the requested action to a running daemon and waits for its result."""
+    if not validate_args(args):
+        sys.exit(1)
+    if getattr(args, 'text_file', None) == '-':
+        print("Error: The daemon can't read this terminal's stdin; pass --text-file a file path instead.")
+        sys.exit(1)
+    for option, value in (('-s/--debug-save', args.debug_save), ('--farm', getattr(args, 'farm', None))):
+        if value: # The daemon prints on its own printer and has no way to honour these
+            print(f"Error: {option} cannot be used with --submit; run it without --submit instead.")
+            sys.exit(1)
+    socket_path = args.socket or DEFAULT_SOCKET_PATH
+    try:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+    except OSError as e:
+        print(f"Error: Could not reach printer daemon at '{socket_path}': {e}")
+        sys.exit(1)
+    writer.write(json.dumps(build_daemon_request(args)).encode() + b"\n")
+    await writer.drain()
+    print(f"Job submitted to daemon at '{socket_path}'. Waiting for result...")
+    line = await reader.readline()
+    writer.close()
+    try: result = json.loads(line)
+    except ValueError:
+        print("Error: Daemon closed the connection without a result.")
+        sys.exit(1)
+    print(f"Daemon result: {result.get('message', '')}")
+    sys.exit(0 if result.get('ok') else 1)
+
+async def _run_daemon_request(client, notifications, request, args):
+    """Prepares and prints (or feeds) one queued request on the daemon's connection."""
+    job_args = argparse.Namespace(**vars(args))
+    for key in DAEMON_JOB_ARGS: setattr(job_args, key, request.get(key))
+    if not validate_args(job_args): return False, "Invalid job arguments."
+    if job_args.feed is not None:
+        success = await feed_paper(client, notifications, job_args.feed, args)
+        return success, f"Feed of {job_args.feed} lines {'completed' if success else 'failed'}."
+    # A request retried after a link loss skips the jobs that already printed
+    done = request.get('resume_at') or 0
+    # Image decoding and rendering run on the prefetch thread so notifications keep flowing
+    jobs_to_print = JobPrefetcher(itertools.islice(iter_print_jobs(job_args), done, None), args.prefetch or DEFAULT_PREFETCH)
+    if not await jobs_to_print.has_next():
+        jobs_to_print.close()
+        if done: return True, f"{done} job(s) printed."
+        return False, "No valid print jobs could be prepared."
+    if done: print(f"[Daemon] Resuming request at job {done + 1}.")
+    success = await print_jobs(client, notifications, jobs_to_print, args)
+    request['resume_at'] = done + jobs_to_print.finished
+    return success, f"{done + jobs_to_print.count} job(s) {'printed' if success else 'failed'}."
+
+async def _daemon_printer_loop(queue, args):
+    """Keeps a warm connection to the printer and works through the queue, reconnecting on link loss."""
+    bluetooth_errors = get_bluetooth_errors(args)
+    retry_item = None # Request interrupted by a link loss, retried first after reconnecting
+    target_address = args.device # None until the first connection resolves a printer (cache or scan)
+    reconnect_delay = DAEMON_RECONNECT_MIN_DELAY
+    while True:
+        link_lost = asyncio.Event()
+        print("[Daemon] Connecting to printer...")
+        try:
+            async with connect_printer(args, address=target_address, disconnected_callback=lambda _: link_lost.set()) as client:
+                target_address = client.address # Reconnect straight to this printer, no scanning
+                reconnect_delay = DAEMON_RECONNECT_MIN_DELAY
+                notifications = NotificationDispatcher() # Fresh per connection: no stale replies survive a reconnect
+                await notifications.start(client)
+                print(f"[Daemon] Connected to {client.address}. Waiting for jobs.")
+                while client.is_connected:
+                    if retry_item is not None:
+                        item, retry_item = retry_item, None
+                    else:
+                        get_task = asyncio.ensure_future(queue.get())
+                        lost_task = asyncio.ensure_future(link_lost.wait())
+                        await asyncio.wait({get_task, lost_task}, return_when=asyncio.FIRST_COMPLETED)
+                        lost_task.cancel()
+                        if not get_task.done():
+                            get_task.cancel()
+                            break
+                        item = get_task.result()
+                    request, result_future = item
+                    try:
+                        success, message = await _run_daemon_request(client, notifications, request, args)
+                    except Exception as e:
+                        success, message = False, f"Error: {e}"
+                    if not success and not client.is_connected:
+                        print("[Daemon] Link lost during job; the unfinished jobs will be retried after reconnecting.")
+                        retry_item = item
+                        break
+                    if not result_future.done(): result_future.set_result((success, message))
+        except bluetooth_errors + (asyncio.TimeoutError, OSError, ValueError) as e:
+            print(f"[Daemon] Connection error: {e}")
+        print(f"[Daemon] Printer link down. Reconnecting in {reconnect_delay:g}s...")
+        await asyncio.sleep(reconnect_delay)
+        reconnect_delay = min(reconnect_delay * 2, DAEMON_RECONNECT_DELAY)
+
+def socket_in_use(socket_path):
+    """True if something (usually another daemon) accepts connections on the Unix socket at socket_path."""
+    import socket
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try: sock.connect(socket_path)
+        except OSError: return False
+    return True
+
+async def run_daemon(args):
+    """Runs the printer daemon: a warm BLE connection fed by jobs arriving on a Unix socket."""
+    socket_path = args.socket or DEFAULT_SOCKET_PATH
+    queue = asyncio.Queue() # Requests are printed strictly in arrival order
+    configure_metrics(args)
+    configure_speed_model(args)
+
+    async def handle_client(reader, writer):
+        line = await reader.readline()
+        if not line: writer.close(); return # Connection probe (socket_in_use) or client gone
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict): raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            writer.write(json.dumps({"ok": False, "message": f"Bad request: {e}"}).encode() + b"\n")
+            await writer.drain(); writer.close()
+            return
+        result_future = asyncio.get_running_loop().create_future()
+        await queue.put((request, result_future))
+        print(f"[Daemon] Job queued ({queue.qsize()} waiting).")
+        success, message = await result_future
+        try:
+            writer.write(json.dumps({"ok": success, "message": message}).encode() + b"\n")
+            await writer.drain()
+        except OSError: pass # Client went away; the job still ran
+        writer.close()
+
+    if os.path.exists(socket_path):
+        if socket_in_use(socket_path):
+            print(f"Error: A daemon is already listening on '{socket_path}'. Stop it first or pass --socket another path.")
+            sys.exit(1)
+        os.unlink(socket_path) # Stale socket from a previous run
+    os.makedirs(os.path.dirname(socket_path) or '.', mode=0o700, exist_ok=True)
+    server = await asyncio.start_unix_server(handle_client, path=socket_path)
+    print(f"[Daemon] Listening for jobs on '{socket_path}'.")
+    try:
+        async with server:
+            await _daemon_printer_loop(queue, args)
+    finally:
+        if os.path.exists(socket_path): os.unlink(socket_path)
+# ---------------------------------
+
 def list_system_fonts():
     """Lists available system fonts using matplotlib."""
-    if not MATPLOTLIB_AVAILABLE:
+    index = get_font_index()
+    if index is None:
         print("Matplotlib is not installed. Cannot list system fonts.")
         print("Please install it with: pip install matplotlib")
         return
 
     print("Available system fonts:")
-    fonts = sorted(list(set(f.name for f in font_manager.fontManager.ttflist)))
+    fonts = sorted(index["fonts"])
     for font_name in fonts:
         print(f"- {font_name}")
 
@@ -777,18 +2592,48 @@ Actions:
     -i, --image <file>     Print a single image file
     -f, --folder <dir>     Print all images from a folder
     -t, --text <string>    Print text
+    --text-file <file>     Print a text file as it is read ('-' for stdin)
+    --template <file>      Print a text template with {field} placeholders
     -p, --feed [lines]     Feed paper (default: 40 lines)
     -x, --test-print       Run test sequence
     -h, --help            Show this help message
 
 Options:
-    -d, --device <addr>    Bluetooth MAC address
+    -d, --device <addr>    Bluetooth MAC address (default: last used, else scan)
+    --scan                 List nearby printers
+    --field <name=value>   Template field value (repeatable)
+    --template-data <csv>  Print one page per CSV row (columns = template fields)
+    --farm <addr> ...      Print on several printers at once (idle printers take the next job)
     -s, --debug-save       Save bitmaps to files instead of printing
     -u, --upside-down      Print upside down
     -z, --font-size <size> Font size for text (default: 24)
     -n, --font <name>      Font name for text (default: Arial)
     -a, --align <pos>      Text alignment: left/center/right (default: left)
     -l, --list-fonts       List available system fonts
+    -w, --workers <n>      Processes preparing folder images (default: CPU cores)
+    --no-cache             Don't use the prepared raster cache
+    --cache-size <MB>      Raster cache size limit, 0 = no cache (default: 100)
+    --stream               Stream images in bands (very tall images and banners)
+    --dither <mode>        Image dithering: floyd-steinberg/atkinson/bayer/threshold
+    --threshold <0-255>    Gray level from which --dither threshold prints white (default: 128)
+    --decode <preset>      Image scaling: fast/quality (default: quality)
+    --trim [rows]          Cap blank rows at the top and bottom of each job (default: 0)
+    --collapse-blank <n>   Shorten blank stretches inside a job to n rows
+    --prefetch <n>         Jobs prepared ahead of the printer (default: 2)
+    --batch                Print consecutive jobs in one print session
+    --batch-gap <rows>     Blank rows between batched jobs (default: 0)
+    --feed-after <lines>   Feed paper after the last job, in the same session
+    --chunk-size <bytes>   Bytes per data write, 1-244 (default: from negotiated MTU)
+    --window <n>           Data writes in flight at once (default: 4)
+    --simulate             Use a simulated printer (no Bluetooth needed)
+    --sim-speed <rows/s>   Print speed of the simulated printer (default: 200)
+    --metrics-jsonl <file> Append per-job timing metrics as JSON lines
+    --metrics-prom <file>  Write metrics as a Prometheus textfile
+
+Daemon:
+    --daemon               Keep the printer connected and serve queued jobs
+    --submit               Send the action to a running daemon
+    --socket <path>        Daemon socket path
 
 Examples:
     1. Print a single image:
@@ -818,6 +2663,13 @@ Examples:
     9. Use different printer:
        python catprint_cli.py -d 00:11:22:33:44:55 -t "Hello"
 
+    10. Keep the printer connected and send jobs to it:
+       python catprint_cli.py --daemon -d 00:11:22:33:44:55 &
+       python catprint_cli.py --submit -t "Hello"
+
+    11. Print one receipt per order:
+       python catprint_cli.py --template receipt.txt --template-data orders.csv --batch
+
 Notes:
     - Multiple actions can be combined (e.g., -i and -t)
     - --feed cannot be used with other actions
@@ -833,17 +2685,49 @@ if __name__ == "__main__":
     parser.add_argument("-i", "--image", help="Path to a single image file to print.")
     parser.add_argument("-f", "--folder", help="Path to a folder containing images to print.")
     parser.add_argument("-t", "--text", help="Text string to print.")
+    parser.add_argument("--text-file", help=f"Text file to print line by line as it is read, in {TEXT_STREAM_BAND_LINES}-line bands; '-' reads stdin (e.g. tail -n 50 app.log | ...).")
+    parser.add_argument("--template", help="Text template file to print; {name} placeholders are filled from --field or --template-data.")
+    parser.add_argument("--field", action="append", metavar="NAME=VALUE", help="Value for a template placeholder (repeatable; defaults for --template-data rows).")
+    parser.add_argument("--template-data", help="CSV file with one record per row (header = field names); one page is printed per row.")
     # Action Arguments
     parser.add_argument("-p", "--feed", type=int, default=None, const=40, nargs='?', help="Feed paper by specified lines (default: 40). Cannot be used with other actions.")
     parser.add_argument("-x", "--test-print", action="store_true", help=f"Run a test sequence (images from '{TEST_IMAGE_FOLDER}/', various texts). Cannot be used with other actions.")
     # Global Options
-    parser.add_argument("-d", "--device", default=DEFAULT_ADDRESS, help=f"Bluetooth MAC address of the printer (default: {DEFAULT_ADDRESS})")
+    parser.add_argument("-d", "--device", default=None, help="Bluetooth MAC address of the printer (default: the last printer used, else the first one found by scanning).")
+    parser.add_argument("--scan", action="store_true", help="Scan for nearby printers, list them and exit.")
     parser.add_argument("-s", "--debug-save", action="store_true", help="Save prepared bitmaps to files instead of printing.")
     parser.add_argument("-u", "--upside-down", action="store_true", help="Print the image(s) or text upside down.")
     parser.add_argument("-z", "--font-size", type=int, default=DEFAULT_FONT_SIZE, help=f"Font size for text printing (default: {DEFAULT_FONT_SIZE})")
     parser.add_argument("-n", "--font", default=DEFAULT_FONT_NAME, help=f"Font name for text printing (default: {DEFAULT_FONT_NAME}). Use --list-fonts to see available system fonts.")
     parser.add_argument("-a", "--align", choices=['left', 'center', 'right'], default='left', help="Text alignment (default: left).")
     parser.add_argument("-l", "--list-fonts", action="store_true", help="List available system fonts and exit.")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes used to prepare --folder and --test-print images (default: number of CPU cores).")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the prepared raster cache.")
+    parser.add_argument("--cache-size", type=float, default=DEFAULT_RASTER_CACHE_MB, help=f"Size limit of the prepared raster cache in MB; 0 disables the cache like --no-cache (default: {DEFAULT_RASTER_CACHE_MB}).")
+    parser.add_argument("--stream", action="store_true", help=f"Prepare and send images in {STREAM_BAND_HEIGHT}-row bands while printing (constant memory, no height limit).")
+    parser.add_argument("--dither", choices=DITHER_MODES, default=DEFAULT_DITHER, help=f"How images are converted to black and white (default: {DEFAULT_DITHER}). atkinson keeps more contrast, bayer prints a regular cross-hatch pattern, threshold prints no pattern at all.")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD, help=f"Gray level (0-255) from which pixels print white with --dither threshold (default: {DEFAULT_THRESHOLD}).")
+    parser.add_argument("--decode", choices=sorted(DECODE_PRESETS), default=DEFAULT_DECODE, help=f"How large images are decoded and scaled to the paper width (default: {DEFAULT_DECODE}). fast decodes JPEGs at the smallest usable scale and resizes with a bilinear filter; quality keeps twice the resolution for a Lanczos resize.")
+    parser.add_argument("--trim", type=int, nargs='?', const=0, default=None, metavar="ROWS", help="Cut blank rows at the top and bottom of each image or text job down to ROWS (default when given: 0), so they are neither sent nor fed.")
+    parser.add_argument("--collapse-blank", type=int, default=None, metavar="ROWS", help="Shorten every blank stretch between printed rows of a job to at most ROWS rows.")
+    parser.add_argument("--batch", action="store_true", help=f"Stack consecutive jobs into as few print sessions as possible (up to {MAX_PRINT_HEIGHT} rows each), skipping the per-job handshake and pauses.")
+    parser.add_argument("--batch-gap", type=int, default=DEFAULT_BATCH_GAP, help=f"Blank rows inserted between jobs merged by --batch (default: {DEFAULT_BATCH_GAP}).")
+    parser.add_argument("--feed-after", type=int, default=None, help="Feed this many blank lines after the last print job; the rows are appended to its raster so no separate feed session is needed.")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH, help=f"Jobs prepared ahead of the one printing (default: {DEFAULT_PREFETCH}). Jobs are prepared on a worker thread while printing, so memory use doesn't grow with the number of jobs.")
+    parser.add_argument("--farm", nargs='+', metavar="ADDRESS", default=None, help="Bluetooth addresses of several printers; jobs go to whichever printer is idle and are moved to another printer if one fails.")
+    # Daemon Options
+    parser.add_argument("--daemon", action="store_true", help="Run as a daemon that keeps the printer connected and prints jobs sent with --submit.")
+    parser.add_argument("--submit", action="store_true", help="Send the requested action to a running daemon instead of connecting directly.")
+    parser.add_argument("--socket", default=None, help=f"Unix socket path used by --daemon and --submit (default: {DEFAULT_SOCKET_PATH}).")
+    # Testing Options
+    parser.add_argument("--simulate", action="store_true", help="Print to a simulated printer instead of a real one (no Bluetooth needed).")
+    parser.add_argument("--sim-speed", type=float, default=200.0, help="Rows per second printed by the simulated printer (default: 200).")
+    # Transfer Options
+    parser.add_argument("--chunk-size", type=int, default=None, help=f"Bytes per data write, 1-{MAX_DATA_CHUNK_SIZE}; capped at what the printer negotiated (default: derived from the negotiated MTU, {DEFAULT_DATA_CHUNK_SIZE}-{MAX_DATA_CHUNK_SIZE}).")
+    parser.add_argument("--window", type=int, default=TRANSFER_WINDOW, help=f"Max data writes in flight at once (default: {TRANSFER_WINDOW}). Use 1 for strictly sequential writes.")
+    # Metrics Options
+    parser.add_argument("--metrics-jsonl", default=None, help="Append one JSON line of phase timings and throughput per print job or feed to this file.")
+    parser.add_argument("--metrics-prom", default=None, help="Keep cumulative job metrics in this Prometheus textfile-collector file (rewritten after every job).")
     
     args = parser.parse_args()
 
@@ -851,5 +2735,15 @@ if __name__ == "__main__":
     if args.list_fonts:
         list_system_fonts()
         sys.exit(0)
+    if args.scan:
+        asyncio.run(list_printers())
+        sys.exit(0)
+
+    if args.daemon:
+        try: asyncio.run(run_daemon(args))
+        except KeyboardInterrupt: print("\n[Daemon] Stopped.")
+        sys.exit(0)
+    if args.submit:
+        asyncio.run(submit_to_daemon(args))
 
     asyncio.run(main(args)) 
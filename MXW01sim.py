@@ -0,0 +1,214 @@
+"""Simulated MXW01 printer for testing and benchmarking without hardware.
+
+SimulatedBleakClient offers the parts of the BleakClient interface that MXW01print.py uses
+(async context manager, services.get_characteristic, start_notify/stop_notify,
+write_gatt_char, mtu_size, is_connected, address) and forwards the traffic to a
+SimulatedPrinter, which implements the protocol as MXW01print.py speaks it:
+
+    AE01  B1, A2        accepted, no reply
+    AE01  A1            replies A1 with an 8-byte status payload (byte 6 = status, 0 = OK)
+    AE01  A9            replies A9 with a status byte and opens a print session of <height> rows
+    AE03  <raster data> collected for the open session
+    AE01  AD            closes the session; AA is sent once the rows have "printed"
+
+Faults can be injected for tests: error statuses, dropped replies (timeouts), rejected data
+writes (congestion, or single rejected writes) and link loss.
+"""
+import asyncio
+import inspect
+from collections import namedtuple
+
+import MXW01print as mx
+
+SIM_ADDRESS = "SIM:00:00:00:00:01"
+SIM_ROWS_PER_SECOND = 200.0 # Simulated paper speed used for the AD -> AA delay
+SIM_RESPONSE_DELAY = 0.005 # Seconds between a command and its notification
+SIM_MTU = 185
+
+# A completed print session as the simulated printer received it
+SimulatedJob = namedtuple('SimulatedJob', ['height', 'width_bytes', 'data'])
+
+class SimulatedCharacteristic:
+    def __init__(self, uuid, max_write_without_response_size=20, service_uuid=mx.PRINTER_SERVICE_UUIDS[0]):
+        self.uuid = uuid
+        self.service_uuid = service_uuid
+        self.max_write_without_response_size = max_write_without_response_size
+
+class SimulatedServices:
+    def __init__(self, characteristics):
+        self._characteristics = {c.uuid: c for c in characteristics}
+
+    def get_characteristic(self, uuid):
+        return self._characteristics.get(uuid)
+
+class SimulatedPrinter:
+    """Printer-side protocol state machine with configurable speed and fault injection."""
+    def __init__(self, rows_per_second=SIM_ROWS_PER_SECOND, response_delay=SIM_RESPONSE_DELAY, mtu=SIM_MTU):
+        self.rows_per_second = rows_per_second
+        self.response_delay = response_delay
+        self.mtu = mtu
+        self.a1_status = 0 # Status byte reported in A1 replies (0 = OK)
+        self.a9_status = 0 # Status byte reported in A9 replies (0 = OK)
+        self.drop_responses = set() # Command IDs whose replies are never sent (simulates timeouts)
+        self._congested_until = 0.0 # Loop time until which AE03 writes are rejected
+        self._data_writes = 0 # AE03 writes attempted so far
+        self._rejected_writes = set() # Numbers of single AE03 writes to reject
+        self.jobs = [] # SimulatedJob for every completed session
+        self.errors = [] # Protocol violations seen (bad CRC, data outside a session, size mismatch)
+        self.commands = [] # Command IDs received on AE01, in order
+        self._session = None # (height, width_bytes) while a print session is open
+        self._data = bytearray()
+        self._busy_until = 0.0 # Loop time when the paper stops moving
+        self._notify = None
+
+    # --- Fault injection ---
+    def fail_next(self, command_id, status=1):
+        """Makes A1 or A9 replies report an error status until reset to 0."""
+        if command_id == 0xA1: self.a1_status = status
+        elif command_id == 0xA9: self.a9_status = status
+        else: raise ValueError("Only A1 and A9 carry a status byte")
+
+    def congest(self, seconds):
+        """Rejects every AE03 write for the given time, like a full BLE transmit queue."""
+        self._congested_until = asyncio.get_running_loop().time() + seconds
+
+    def reject_writes(self, *numbers):
+        """Rejects only the given AE03 writes, counted from 1 from now on (reject_writes(3) fails the third)."""
+        self._rejected_writes = {self._data_writes + n for n in numbers}
+
+    def drop(self, command_id):
+        """Never reply to command_id (A1, A9 or AD/AA) so the host runs into its timeout."""
+        self.drop_responses.add(command_id)
+
+    # --- Protocol ---
+    def _send(self, command_id, payload, delay):
+        if command_id in self.drop_responses or self._notify is None: return
+        frame = bytes([0x22, 0x21, command_id, 0x00]) + len(payload).to_bytes(2, 'little') + bytes(payload) + bytes([mx.calculate_crc8(payload), 0xFF])
+        asyncio.get_running_loop().call_later(delay, self._notify, frame)
+
+    def handle_control(self, frame):
+        if len(frame) < 8 or frame[0] != 0x22 or frame[1] != 0x21:
+            self.errors.append(f"Malformed control frame: {bytes(frame).hex()}"); return
+        command_id = frame[2]
+        length = int.from_bytes(frame[4:6], 'little')
+        data = bytes(frame[6:6 + length])
+        self.commands.append(command_id)
+        if command_id in (0xB1, 0xA2, 0xA1) and frame[6 + length] != mx.calculate_crc8(data):
+            self.errors.append(f"Bad CRC on command {command_id:02X}")
+
+        if command_id == 0xA1:
+            self._send(0xA1, bytes([0, 0, 0, 0, 0, 0, self.a1_status, 0]), self.response_delay)
+        elif command_id == 0xA9:
+            height = int.from_bytes(data[0:2], 'little')
+            width_bytes = int.from_bytes(data[2:4], 'little')
+            if self.a9_status == 0:
+                self._session = (height, width_bytes)
+                self._data = bytearray()
+            self._send(0xA9, bytes([self.a9_status]), self.response_delay)
+        elif command_id == 0xAD:
+            if self._session is None:
+                self.errors.append("AD without an open print session"); return
+            height, width_bytes = self._session
+            if len(self._data) != height * width_bytes:
+                self.errors.append(f"Session declared {height * width_bytes} bytes but received {len(self._data)}")
+            self.jobs.append(SimulatedJob(height, width_bytes, bytes(self._data)))
+            self._session = None
+            # The paper only starts moving once the previous job has finished
+            now = asyncio.get_running_loop().time()
+            self._busy_until = max(now, self._busy_until) + height / self.rows_per_second
+            self._send(0xAA, bytes([0x00]), self._busy_until - now + self.response_delay)
+
+    def handle_data(self, data):
+        self._data_writes += 1
+        if self._data_writes in self._rejected_writes:
+            raise _write_error(f"Simulated write error: write {self._data_writes} rejected")
+        if asyncio.get_running_loop().time() < self._congested_until:
+            raise _write_error("Simulated congestion: write rejected")
+        if self._session is None:
+            self.errors.append("Data received outside a print session"); return
+        self._data += data
+
+_printers = {} # Address -> SimulatedPrinter, so reconnecting finds the same printer
+
+def printer_for(address, **kwargs):
+    """Returns the simulated printer at address, creating it with kwargs on first use."""
+    if address not in _printers: _printers[address] = SimulatedPrinter(**kwargs)
+    return _printers[address]
+
+def _write_error(message):
+    """Builds the exception a real backend would raise (BleakError when bleak is installed)."""
+    try:
+        from bleak.exc import BleakError
+        return BleakError(message)
+    except ImportError:
+        return RuntimeError(message)
+
+class SimulatedBleakClient:
+    """Drop-in replacement for BleakClient that talks to a SimulatedPrinter."""
+    def __init__(self, address_or_ble_device=SIM_ADDRESS, timeout=10.0, disconnected_callback=None, printer=None, **kwargs):
+        self.address = getattr(address_or_ble_device, 'address', address_or_ble_device) or SIM_ADDRESS
+        self.printer = printer if printer is not None else SimulatedPrinter()
+        self._disconnected_callback = disconnected_callback
+        self._connected = False
+        self._callbacks = {}
+        chunk = self.printer.mtu - 3
+        self.services = SimulatedServices([
+            SimulatedCharacteristic(mx.CONTROL_WRITE_UUID, chunk),
+            SimulatedCharacteristic(mx.NOTIFY_UUID, chunk),
+            SimulatedCharacteristic(mx.DATA_WRITE_UUID, chunk),
+        ])
+
+    @property
+    def is_connected(self):
+        return self._connected
+
+    @property
+    def mtu_size(self):
+        return self.printer.mtu
+
+    async def connect(self, **kwargs):
+        self._connected = True
+        self.printer._notify = self._deliver
+        return True
+
+    async def disconnect(self):
+        was_connected = self._connected
+        self._connected = False
+        self.printer._notify = None
+        if was_connected and self._disconnected_callback: self._disconnected_callback(self)
+        return True
+
+    def simulate_link_loss(self):
+        """Drops the connection as if the printer went out of range."""
+        asyncio.get_running_loop().create_task(self.disconnect())
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.disconnect()
+
+    async def start_notify(self, char_specifier, callback, **kwargs):
+        self._callbacks[getattr(char_specifier, 'uuid', char_specifier)] = callback
+
+    async def stop_notify(self, char_specifier):
+        self._callbacks.pop(getattr(char_specifier, 'uuid', char_specifier), None)
+
+    def _deliver(self, frame):
+        callback = self._callbacks.get(mx.NOTIFY_UUID)
+        if callback is None or not self._connected: return
+        result = callback(self.services.get_characteristic(mx.NOTIFY_UUID), bytearray(frame))
+        if inspect.isawaitable(result): asyncio.ensure_future(result)
+
+    async def write_gatt_char(self, char_specifier, data, response=False):
+        if not self._connected: raise _write_error("Not connected")
+        uuid = getattr(char_specifier, 'uuid', char_specifier)
+        await asyncio.sleep(0) # Yield like a real backend would
+        if uuid == mx.CONTROL_WRITE_UUID:
+            self.printer.handle_control(bytes(data))
+        elif uuid == mx.DATA_WRITE_UUID:
+            if len(data) > self.printer.mtu - 3: raise _write_error(f"Write of {len(data)} bytes exceeds MTU")
+            self.printer.handle_data(bytes(data))
+        else:
+            raise _write_error(f"Characteristic {uuid} does not support write")
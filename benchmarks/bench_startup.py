@@ -0,0 +1,77 @@
+"""Measures MXW01print.py startup cost per action.
+
+Each action is run in a fresh interpreter with `python -X importtime`, so the numbers include
+interpreter start, imports and the action itself (no printer is contacted: printing actions use
+--debug-save). The import cost of the heavy third-party packages is reported separately.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat N] [--json results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(REPO_DIR, "MXW01print.py")
+TEST_IMAGE = os.path.join(REPO_DIR, "test_print_images", "Thermal_Test_Image.png")
+HEAVY_PACKAGES = ("bleak", "PIL", "matplotlib", "numpy")
+
+# (name, arguments) for every action worth timing
+ACTIONS = [
+    ("no-action (arg error)", []),
+    ("--list-fonts", ["-l"]),
+    ("--image --debug-save", ["-i", TEST_IMAGE, "-s"]),
+    ("--text --debug-save", ["-t", "Startup benchmark", "-s"]),
+]
+
+def run_action(arguments, workdir):
+    """Runs one action and returns (wall seconds, {package: cumulative import seconds})."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", SCRIPT] + arguments, cwd=workdir,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - start
+    imports = {}
+    for line in proc.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:"): continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3: continue
+        name = parts[2][1:] # Nested imports are indented below their importer; only count top-level ones
+        if not name.startswith(" ") and name.split(".")[0] in HEAVY_PACKAGES:
+            name = name.split(".")[0]
+            try: imports[name] = imports.get(name, 0.0) + int(parts[1]) / 1e6
+            except ValueError: pass
+    return wall, imports
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure MXW01print.py startup time per action.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per action; the fastest is reported (default: 3).")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mxw01_startup_") # Keeps debug_output/ out of the repo
+    results = {}
+    try:
+        print(f"{'Action':<24} {'Wall (s)':>9}  Import cost")
+        for name, arguments in ACTIONS:
+            best_wall, best_imports = None, {}
+            for _ in range(max(1, args.repeat)):
+                wall, imports = run_action(arguments, workdir)
+                if best_wall is None or wall < best_wall: best_wall, best_imports = wall, imports
+            results[name] = {"wall_seconds": best_wall, "imports": best_imports}
+            cost = ", ".join(f"{pkg} {sec:.3f}s" for pkg, sec in sorted(best_imports.items())) or "none"
+            print(f"{name:<24} {best_wall:>9.3f}  {cost}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f: json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+if __name__ == "__main__":
+    main()
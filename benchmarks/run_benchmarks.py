@@ -0,0 +1,273 @@
+"""Benchmark suite for the image, text, protocol and transport hot paths of MXW01print.py.
+
+Every case runs in its own interpreter so its peak memory can be measured from the process's
+maximum resident set size (Pillow allocates outside the Python heap, so tracemalloc would miss
+most of it). Time is the best of --repeat runs.
+
+Results can be saved as a baseline and later runs are compared against it; a case that is
+slower (or uses more memory) than the baseline by more than --tolerance counts as a regression
+and makes the script exit with status 1.
+
+Usage:
+    python benchmarks/run_benchmarks.py                   # run and compare with the baseline
+    python benchmarks/run_benchmarks.py --save-baseline   # run and store the results as the baseline
+    python benchmarks/run_benchmarks.py -k crc8           # only cases whose name contains "crc8"
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+TEST_IMAGE_DIR = os.path.join(REPO_DIR, "test_print_images")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_TOLERANCE = 0.25 # Allowed slowdown / memory growth against the baseline (25%)
+MEMORY_NOISE_MB = 2.0 # Memory differences below this are never reported as regressions
+RECEIPT_TEMPLATE = "COFFEE SHOP\n123 Main Street\n\nOrder #{order}\nItem: {item}\nTotal: {total}\n\nThank you for your visit!"
+LONG_TEXT = " ".join(["The quick brown fox jumps over the lazy dog."] * 400)
+
+# --- Inputs ---
+def large_image_path(workdir, ext):
+    """Creates (once) a deterministic 4000x3000 photo-like test image in workdir."""
+    path = os.path.join(workdir, f"large_4000x3000{ext}")
+    if not os.path.exists(path):
+        from PIL import Image
+        gray = Image.effect_mandelbrot((4000, 3000), (-2.0, -1.2, 0.8, 1.2), 64)
+        Image.merge("RGB", (gray, gray.rotate(180), gray.transpose(Image.Transpose.FLIP_LEFT_RIGHT))).save(path)
+    return path
+
+def prepared_image(height):
+    """A dithered 1-bit printer-width image of the given height."""
+    from PIL import Image
+    import MXW01print as mx
+    return Image.effect_mandelbrot((mx.PRINTER_WIDTH_PIXELS, height), (-2.0, -1.2, 0.8, 1.2), 32).convert("1")
+
+def simulated_client():
+    from MXW01sim import SimulatedBleakClient, SimulatedPrinter
+    # Fast paper so the transport and the host-side protocol overhead dominate
+    return SimulatedBleakClient(printer=SimulatedPrinter(rows_per_second=20000.0, response_delay=0.001))
+
+# --- Cases ---
+# Each case is setup(workdir) -> run(), where run() is the timed part.
+def make_prepare_test_images_case(decode):
+    def case(workdir):
+        import MXW01print as mx
+        paths = sorted(os.path.join(TEST_IMAGE_DIR, f) for f in os.listdir(TEST_IMAGE_DIR) if f.lower().endswith(mx.SUPPORTED_EXTENSIONS))
+        return lambda: [mx.prepare_image_for_print(p, mx.PRINTER_WIDTH_PIXELS, decode=decode) for p in paths]
+    return case
+
+def make_prepare_large_jpeg_case(decode):
+    def case(workdir):
+        import MXW01print as mx
+        path = large_image_path(workdir, ".jpg")
+        return lambda: mx.prepare_image_for_print(path, mx.PRINTER_WIDTH_PIXELS, decode=decode)
+    return case
+
+def case_prepare_large_png(workdir):
+    import MXW01print as mx
+    path = large_image_path(workdir, ".png")
+    return lambda: mx.prepare_image_for_print(path, mx.PRINTER_WIDTH_PIXELS)
+
+def make_process_image_case(height):
+    def case(workdir):
+        import MXW01print as mx
+        img = prepared_image(height)
+        return lambda: mx.process_image(img)
+    return case
+
+def make_text_case(text):
+    def case(workdir):
+        import MXW01print as mx
+        font = mx.load_font(mx.DEFAULT_FONT_NAME, mx.DEFAULT_FONT_SIZE)
+        return lambda: mx.create_text_bitmap(text, font, mx.PRINTER_WIDTH_PIXELS)
+    return case
+
+def case_template_receipts(workdir):
+    import MXW01print as mx
+    font = mx.load_font(mx.DEFAULT_FONT_NAME, mx.DEFAULT_FONT_SIZE)
+    template = mx.TextTemplate(RECEIPT_TEMPLATE, font, mx.PRINTER_WIDTH_PIXELS, "center")
+    return lambda: [template.render({"order": str(1000 + i), "item": "Latte grande", "total": "4.50"}) for i in range(100)]
+
+def make_dither_case(mode):
+    def case(workdir):
+        from PIL import Image
+        import MXW01print as mx
+        img = Image.effect_mandelbrot((mx.PRINTER_WIDTH_PIXELS, 2000), (-2.0, -1.2, 0.8, 1.2), 64)
+        return lambda: mx.dither_image(img, mode)
+    return case
+
+def case_trim_raster(workdir):
+    import MXW01print as mx
+    raster = mx.pack_raster(mx.create_text_bitmap(LONG_TEXT + "\n" * 200, mx.load_font(mx.DEFAULT_FONT_NAME, mx.DEFAULT_FONT_SIZE), mx.PRINTER_WIDTH_PIXELS))
+    return lambda: mx.trim_raster(raster, margin=0, max_gap=4)
+
+def case_first_job_of_folder(workdir):
+    import MXW01print as mx
+    folder = os.path.join(workdir, "folder_200")
+    if not os.path.isdir(folder):
+        from PIL import Image
+        os.makedirs(folder)
+        img = Image.effect_mandelbrot((800, 600), (-2.0, -1.2, 0.8, 1.2), 64)
+        for i in range(200): img.save(os.path.join(folder, f"img{i:03d}.jpg"))
+    args = argparse.Namespace(test_print=False, image=None, folder=folder, text=None, upside_down=False, no_cache=True, workers=1)
+    return lambda: next(mx.iter_print_jobs(args))
+
+def case_crc8_1mb(workdir):
+    import MXW01print as mx
+    payload = os.urandom(1024 * 1024)
+    return lambda: mx.calculate_crc8(payload)
+
+def case_print_job_sim(workdir):
+    import MXW01print as mx
+    img = prepared_image(1000)
+    async def cycle():
+        async with simulated_client() as client:
+            notifications = mx.NotificationDispatcher()
+            await notifications.start(client)
+            assert await mx.run_print_job(client, notifications, img, "benchmark")
+    return lambda: asyncio.run(cycle())
+
+def case_feed_paper_sim(workdir):
+    import MXW01print as mx
+    async def cycle():
+        async with simulated_client() as client:
+            notifications = mx.NotificationDispatcher()
+            await notifications.start(client)
+            assert await mx.run_feed_paper(client, notifications, 600)
+    return lambda: asyncio.run(cycle())
+
+CASES = {
+    "prepare_image/test_print_images": make_prepare_test_images_case("quality"),
+    "prepare_image/test_print_images_fast": make_prepare_test_images_case("fast"),
+    "prepare_image/large_jpeg_4000x3000": make_prepare_large_jpeg_case("quality"),
+    "prepare_image/large_jpeg_4000x3000_fast": make_prepare_large_jpeg_case("fast"),
+    "prepare_image/large_png_4000x3000": case_prepare_large_png,
+    "process_image/h100": make_process_image_case(100),
+    "process_image/h1000": make_process_image_case(1000),
+    "process_image/h10000": make_process_image_case(10000),
+    "dither/floyd-steinberg_h2000": make_dither_case("floyd-steinberg"),
+    "dither/atkinson_h2000": make_dither_case("atkinson"),
+    "dither/bayer_h2000": make_dither_case("bayer"),
+    "dither/threshold_h2000": make_dither_case("threshold"),
+    "text_bitmap/short": make_text_case("Order #1042 - Thank you!"),
+    "text_bitmap/long": make_text_case(LONG_TEXT),
+    "text_bitmap/template_100_receipts": case_template_receipts,
+    "raster/trim_long_text": case_trim_raster,
+    "pipeline/first_job_of_200_images": case_first_job_of_folder,
+    "crc8/1mb": case_crc8_1mb,
+    "transport/print_job_1000_rows_sim": case_print_job_sim,
+    "transport/feed_600_lines_sim": case_feed_paper_sim,
+}
+
+# --- Runner ---
+def _proc_status_mb(field):
+    """Reads a memory field (e.g. VmRSS, VmHWM) from /proc/self/status, or None off Linux."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"): return int(line.split()[1]) / 1024
+    except OSError: pass
+    return None
+
+def _reset_peak_rss():
+    """Starts a fresh peak measurement and returns the current baseline in MB.
+
+    On Linux the high-water mark is reset through /proc/self/clear_refs; ru_maxrss can't be
+    used there because it carries over the parent's peak across fork+exec.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+        return _proc_status_mb("VmRSS")
+    except OSError:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024 # bytes on macOS, KiB elsewhere
+
+def _peak_rss_mb():
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None: return peak
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+def run_case_in_process(name, workdir, repeat):
+    """Runs one case in this process and prints its result as JSON (child side)."""
+    import contextlib
+    with contextlib.redirect_stdout(open(os.devnull, "w")): # Silence the tool's progress output
+        import PIL.Image, MXW01print # Import cost is not part of any case
+        run = CASES[name](workdir)
+        rss_before = _reset_peak_rss()
+        best = None
+        for _ in range(max(1, repeat)):
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        peak_mb = max(0.0, _peak_rss_mb() - rss_before)
+    print(json.dumps({"seconds": best, "peak_mb": peak_mb}))
+
+def run_case(name, workdir, repeat):
+    """Runs one case in a fresh interpreter and returns its result dict (parent side)."""
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", name, "--workdir", workdir, "--repeat", str(repeat)],
+                          capture_output=True, text=True, cwd=workdir)
+    if proc.returncode != 0:
+        return {"error": (proc.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def compare(name, result, baseline, tolerance):
+    """Returns a short verdict string and whether the case regressed against the baseline."""
+    base = baseline.get(name)
+    if not base or "seconds" not in base or "seconds" not in result: return "new", False
+    time_ratio = result["seconds"] / base["seconds"] if base["seconds"] else 1.0
+    memory_growth = result["peak_mb"] - base["peak_mb"]
+    regressed = time_ratio > 1 + tolerance or (memory_growth > MEMORY_NOISE_MB and result["peak_mb"] > base["peak_mb"] * (1 + tolerance))
+    return f"{time_ratio:5.2f}x time, {memory_growth:+.1f} MB", regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MXW01print.py hot paths.")
+    parser.add_argument("-k", "--filter", help="Only run cases whose name contains this text.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case; the fastest is reported (default: 3).")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file (default: benchmarks/baseline.json).")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run's results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed relative slowdown before a case counts as a regression (default: 0.25).")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        run_case_in_process(args.run_case, args.workdir, args.repeat)
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="mxw01_bench_")
+    for ext in (".jpg", ".png"): large_image_path(workdir, ext) # Generated up front so it doesn't count as case memory
+    results, regressions = {}, []
+    print(f"{'Case':<38} {'Time (s)':>10} {'Peak (MB)':>10}  vs baseline")
+    for name in CASES:
+        if args.filter and args.filter not in name: continue
+        result = run_case(name, workdir, args.repeat)
+        results[name] = result
+        if "error" in result:
+            print(f"{name:<38} {'ERROR':>10} {'':>10}  {result['error']}")
+            regressions.append(name)
+            continue
+        verdict, regressed = compare(name, result, baseline, args.tolerance)
+        if regressed: regressions.append(name); verdict += "  REGRESSION"
+        print(f"{name:<38} {result['seconds']:>10.4f} {result['peak_mb']:>10.1f}  {verdict}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f: json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} case(s) regressed or failed: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Checks how --batch, --batch-gap and --feed-after combine jobs, down to the rows the printer receives."""
+import argparse
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MXW01print as mxw
+from MXW01sim import SimulatedBleakClient, SimulatedPrinter
+
+ROW = mxw.PRINTER_WIDTH_BYTES
+
+@pytest.fixture(autouse=True)
+def fresh_speed_model(monkeypatch):
+    monkeypatch.setattr(mxw, '_speed_model', mxw.PrintSpeedModel())
+
+def raster(height, fill):
+    return mxw.PackedRaster(bytes([fill]) * (ROW * height), height)
+
+def print_on_simulator(jobs):
+    """Prints the jobs on a fresh simulated printer and returns it."""
+    printer = SimulatedPrinter(rows_per_second=20000.0, response_delay=0.001)
+    args = argparse.Namespace(chunk_size=None, window=mxw.TRANSFER_WINDOW, prefetch=2)
+    async def cycle():
+        async with SimulatedBleakClient(printer=printer) as client:
+            notifications = mxw.NotificationDispatcher()
+            await notifications.start(client)
+            return await mxw.print_jobs(client, notifications, jobs, args)
+    assert asyncio.run(cycle())
+    assert printer.errors == []
+    return printer
+
+def test_batch_merges_with_gap():
+    jobs = [(raster(10, 0x01), "a"), (raster(5, 0x02), "b"), (raster(7, 0x03), "c")]
+    merged = list(mxw.batch_print_jobs(jobs, gap_rows=3))
+    assert len(merged) == 1
+    packed, description = merged[0]
+    assert packed.height == 10 + 3 + 5 + 3 + 7
+    gap = bytes(ROW * 3)
+    assert packed.data == raster(10, 0x01).data + gap + raster(5, 0x02).data + gap + raster(7, 0x03).data
+    assert description == "Batch of 3: a, b, c"
+
+def test_batch_splits_at_print_height_limit(monkeypatch):
+    monkeypatch.setattr(mxw, 'MAX_PRINT_HEIGHT', 30)
+    jobs = [(raster(10, 0x01), "a"), (raster(10, 0x02), "b"), (raster(9, 0x03), "c"), (raster(10, 0x04), "d")]
+    # a + 1 + b + 1 + c would be 31 rows, one over the limit
+    merged = list(mxw.batch_print_jobs(jobs, gap_rows=1))
+    assert [packed.height for packed, _ in merged] == [21, 20]
+    assert [description for _, description in merged] == ["Batch of 2: a, b", "Batch of 2: c, d"]
+
+def test_batch_keeps_too_tall_and_streamed_jobs_separate(monkeypatch):
+    monkeypatch.setattr(mxw, 'MAX_PRINT_HEIGHT', 30)
+    stream = mxw.StreamImage("tall.png", mxw.PRINTER_WIDTH_PIXELS, False)
+    jobs = [(raster(5, 0x01), "a"), (raster(40, 0x02), "tall"), (stream, "stream"), (raster(5, 0x03), "b")]
+    merged = list(mxw.batch_print_jobs(jobs))
+    assert [description for _, description in merged] == ["a", "tall", "stream", "b"]
+
+def test_batch_gap_and_feed_after_rows_reach_printer():
+    jobs = [(raster(10, 0x01), "a"), (raster(6, 0x02), "b")]
+    printer = print_on_simulator(list(mxw.append_feed_rows(mxw.batch_print_jobs(jobs, gap_rows=4), 12)))
+    assert [job.height for job in printer.jobs] == [10 + 4 + 6 + 12] # One session, feed rows appended
+    data = printer.jobs[0].data
+    assert data == raster(10, 0x01).data + bytes(ROW * 4) + raster(6, 0x02).data + bytes(ROW * 12)
+
+def test_feed_after_becomes_feed_job_when_rows_do_not_fit(monkeypatch):
+    monkeypatch.setattr(mxw, 'MAX_PRINT_HEIGHT', 20)
+    jobs = list(mxw.append_feed_rows([(raster(15, 0x01), "a")], 10))
+    assert jobs[0] == (raster(15, 0x01), "a")
+    assert jobs[1] == (mxw.FeedJob(10), "Feed: 10 lines")
+    printer = print_on_simulator(jobs)
+    assert [job.height for job in printer.jobs] == [15, 10]
+    assert printer.jobs[1].data == bytes(ROW * 10)
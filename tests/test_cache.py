@@ -0,0 +1,88 @@
+"""Checks the on-disk raster cache: hits, keys that change with the source or options, and damaged entries."""
+import argparse
+import os
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MXW01print as mxw
+
+ROW = mxw.PRINTER_WIDTH_BYTES
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = mxw.RasterCache(str(tmp_path / "rasters"))
+    monkeypatch.setattr(mxw, '_raster_cache', cache)
+    return cache
+
+@pytest.fixture
+def image_path(tmp_path):
+    path = str(tmp_path / "label.png")
+    Image.effect_mandelbrot((200, 60), (-2.0, -1.2, 0.8, 1.2), 32).save(path)
+    return path
+
+def make_args(**options):
+    defaults = dict(stream=False, workers=1, upside_down=False, dither=None, threshold=None, decode=None, no_cache=False, cache_size=None)
+    return argparse.Namespace(**{**defaults, **options})
+
+def prepare(path, args):
+    return list(mxw.iter_image_files([path], args))[0]
+
+def test_put_and_get(cache):
+    raster = mxw.PackedRaster(bytes(range(ROW)) * 3, 3)
+    assert cache.get("k") is None
+    cache.put("k", raster)
+    assert cache.get("k") == raster
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_second_preparation_is_a_hit(cache, image_path):
+    first = prepare(image_path, make_args())
+    assert cache.hits == 0
+    assert prepare(image_path, make_args()) == first
+    assert cache.hits == 1
+
+def test_changed_source_is_a_miss(cache, image_path):
+    args = make_args()
+    key = mxw.image_cache_key(image_path, args)
+    first = prepare(image_path, args)
+    Image.new('L', (200, 60), 0).save(image_path) # New contents (and mtime)
+    assert mxw.image_cache_key(image_path, args) != key
+    second = prepare(image_path, args)
+    assert second != first and second == prepare(image_path, make_args(no_cache=True))
+    assert cache.hits == 0
+
+def test_touched_source_is_still_a_hit(cache, image_path):
+    # Entries are addressed by content, so a new mtime alone doesn't invalidate them
+    first = prepare(image_path, make_args())
+    os.utime(image_path, (1, 1))
+    assert prepare(image_path, make_args()) == first
+    assert cache.hits == 1
+
+@pytest.mark.parametrize("options", [dict(upside_down=True), dict(dither='bayer'), dict(dither='threshold', threshold=90), dict(decode='fast')])
+def test_options_change_key(image_path, options):
+    assert mxw.image_cache_key(image_path, make_args(**options)) != mxw.image_cache_key(image_path, make_args())
+
+def test_threshold_only_matters_to_threshold_mode(image_path):
+    assert mxw.image_cache_key(image_path, make_args(threshold=90)) == mxw.image_cache_key(image_path, make_args())
+
+@pytest.mark.parametrize("damage", [b"", b"\x05\x00", b"\x10\x00\x00\x00" + bytes(ROW)])
+def test_corrupt_entry_is_rebuilt(cache, image_path, damage):
+    args = make_args()
+    first = prepare(image_path, args)
+    with open(cache._path(mxw.image_cache_key(image_path, args)), 'wb') as f: f.write(damage)
+    assert prepare(image_path, args) == first # Damaged entry counts as a miss and is rewritten
+    assert cache.hits == 0
+    assert prepare(image_path, args) == first
+    assert cache.hits == 1
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = mxw.RasterCache(str(tmp_path), max_bytes=2 * (4 + ROW))
+    for i, key in enumerate(("a", "b")):
+        cache.put(key, mxw.PackedRaster(bytes(ROW), 1))
+        os.utime(cache._path(key), (i, i))
+    cache.get("a") # Now more recent than b
+    cache.put("c", mxw.PackedRaster(bytes(ROW), 1))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
@@ -0,0 +1,68 @@
+"""Checks the dither modes on fixed inputs and that streamed bands match dithering the whole image."""
+import os
+import random
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MXW01print as mxw
+
+def white_count(img):
+    return img.convert('L').histogram()[255]
+
+def gray(width, height, level):
+    return Image.new('L', (width, height), level)
+
+def noise(width, height, seed):
+    rng = random.Random(seed)
+    return Image.frombytes('L', (width, height), bytes(rng.randrange(256) for _ in range(width * height)))
+
+@pytest.mark.parametrize("mode", mxw.DITHER_MODES)
+@pytest.mark.parametrize("level, white", [(0, 0), (255, 64 * 64)])
+def test_solid_black_and_white(mode, level, white):
+    assert white_count(mxw.dither_image(gray(64, 64, level), mode)) == white
+
+@pytest.mark.parametrize("mode", ["floyd-steinberg", "atkinson", "bayer"])
+def test_mid_gray_is_half_white(mode):
+    # Error diffusion and the ordered pattern keep the average brightness
+    assert abs(white_count(mxw.dither_image(gray(64, 64, 128), mode)) - 64 * 32) <= 64
+
+def test_threshold():
+    ramp = Image.frombytes('L', (256, 1), bytes(range(256)))
+    out = mxw.dither_image(ramp, 'threshold', threshold=100).convert('L').tobytes()
+    assert out == bytes(100) + b'\xff' * 156
+
+def test_bayer_pattern():
+    # Cells with threshold 4*c+2 below the level turn white: exactly half of each 8x8 tile at 128
+    out = mxw.dither_image(gray(16, 16, 128), 'bayer').convert('L')
+    for y in range(16):
+        for x in range(16):
+            assert (out.getpixel((x, y)) == 255) == (mxw.BAYER_MATRIX[y % 8][x % 8] < 32)
+
+def test_floyd_steinberg_matches_pillow():
+    img = noise(97, 41, seed=1)
+    assert mxw.Ditherer('floyd-steinberg')(img).tobytes() == img.convert('1').tobytes()
+
+def test_unknown_mode():
+    with pytest.raises(ValueError): mxw.Ditherer('halftone')
+
+@pytest.mark.parametrize("mode", mxw.DITHER_MODES)
+@pytest.mark.parametrize("band_height", [1, 7, 64])
+def test_bands_match_whole_image(mode, band_height):
+    img = Image.effect_mandelbrot((48, 150), (-2.0, -1.2, 0.8, 1.2), 64)
+    ditherer = mxw.Ditherer(mode)
+    banded = Image.new('1', img.size)
+    for y in range(0, img.height, band_height):
+        banded.paste(ditherer(img.crop((0, y, img.width, min(y + band_height, img.height)))), (0, y))
+    assert banded.tobytes() == mxw.dither_image(img, mode).tobytes()
+
+@pytest.mark.parametrize("mode", ["floyd-steinberg", "threshold"])
+def test_streamed_image_matches_prepared_image(tmp_path, mode):
+    path = str(tmp_path / "tall.png")
+    img = Image.effect_mandelbrot((mxw.PRINTER_WIDTH_PIXELS, 3 * mxw.STREAM_BAND_HEIGHT + 17), (-2.0, -1.2, 0.8, 1.2), 64)
+    img.save(path)
+    source = mxw.StreamImage(path, mxw.PRINTER_WIDTH_PIXELS, False, mode, mxw.DEFAULT_THRESHOLD)
+    streamed = b"".join(mxw.iter_stream_bands(source))
+    assert streamed == mxw.process_image(mxw.dither_image(img, mode))
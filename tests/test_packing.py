@@ -0,0 +1,71 @@
+"""Checks the table-driven raster packer and CRC-8 against the original per-pixel versions."""
+import os
+import random
+import sys
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MXW01print as mxw
+
+# --- Reference implementations (as first shipped in MXW01print.py) ---
+def reference_process_image(img):
+    """Packs 8 pixels per byte, LSB first, bit set for a black pixel."""
+    pixels = img.load()
+    width, height = img.size
+    processed_data = bytearray()
+    for y in range(height):
+        byte = 0
+        for x in range(width):
+            if pixels[x, y] == 0: byte |= (1 << (x % 8))
+            if (x + 1) % 8 == 0 or (x + 1) == width:
+                processed_data.append(byte)
+                byte = 0
+    return bytes(processed_data)
+
+def reference_crc8(data):
+    """Bitwise CRC-8, polynomial 0x07, initial value 0x00."""
+    crc = 0x00
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) if crc & 0x80 else crc << 1
+            crc &= 0xFF
+    return crc
+# ---------------------------------------------------------------------
+
+def random_bitmap(width, height, seed):
+    rng = random.Random(seed)
+    return Image.frombytes('1', (width, height), bytes(rng.randrange(256) for _ in range((width + 7) // 8 * height)))
+
+@pytest.mark.parametrize("width", [1, 7, 8, 9, 13, 100, mxw.PRINTER_WIDTH_PIXELS - 1, mxw.PRINTER_WIDTH_PIXELS])
+@pytest.mark.parametrize("height", [1, 3, 64])
+def test_process_image_matches_reference(width, height):
+    img = random_bitmap(width, height, seed=width * 1000 + height)
+    packed = mxw.process_image(img)
+    assert packed == reference_process_image(img)
+    assert mxw.pack_raster(img) == (packed, height)
+
+@pytest.mark.parametrize("fill", [0, 255])
+def test_process_image_solid(fill):
+    img = Image.new('1', (mxw.PRINTER_WIDTH_PIXELS, 5), fill)
+    assert mxw.process_image(img) == reference_process_image(img)
+
+def test_process_image_spans_bands():
+    # Taller than one band, so the band joins are covered too
+    img = random_bitmap(mxw.PRINTER_WIDTH_PIXELS, 700, seed=7)
+    assert mxw.process_image(img) == reference_process_image(img)
+
+def test_packed_to_image_round_trip():
+    img = random_bitmap(mxw.PRINTER_WIDTH_PIXELS, 20, seed=3)
+    assert mxw.packed_to_image(mxw.process_image(img), 20).tobytes() == img.tobytes()
+
+@pytest.mark.parametrize("length", [0, 1, 2, 5, 64, 1000])
+def test_crc8_matches_reference(length):
+    data = bytes(random.Random(length).randrange(256) for _ in range(length))
+    assert mxw.calculate_crc8(data) == reference_crc8(data)
+
+def test_crc8_continues_from_previous_value():
+    data = bytes(range(256))
+    assert mxw.calculate_crc8(data[100:], mxw.calculate_crc8(data[:100])) == reference_crc8(data)
@@ -0,0 +1,186 @@
+"""Runs the print protocol against the simulated printer in MXW01sim.py, with injected faults."""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MXW01print as mxw
+from MXW01sim import SIM_ADDRESS, SimulatedBleakClient, SimulatedPrinter
+
+@pytest.fixture(autouse=True)
+def fresh_speed_model(monkeypatch):
+    """Keeps AA timeouts independent of other tests and of the on-disk history."""
+    monkeypatch.setattr(mxw, '_speed_model', mxw.PrintSpeedModel())
+    monkeypatch.setattr(mxw, 'TRANSFER_BACKOFF_DELAY', 0.001)
+
+def fast_printer():
+    return SimulatedPrinter(rows_per_second=20000.0, response_delay=0.001)
+
+def random_raster(height, seed):
+    rng = random.Random(seed)
+    return mxw.PackedRaster(bytes(rng.randrange(256) for _ in range(mxw.PRINTER_WIDTH_BYTES * height)), height)
+
+def run_job(printer, job, setup=None):
+    """Connects to printer, applies setup(client), then runs job(client, notifications)."""
+    async def cycle():
+        async with SimulatedBleakClient(printer=printer) as client:
+            notifications = mxw.NotificationDispatcher()
+            await notifications.start(client)
+            if setup: setup(client)
+            return await job(client, notifications)
+    return asyncio.run(cycle())
+
+def print_raster(raster, **kwargs):
+    return lambda client, notifications: mxw.run_print_job(client, notifications, raster, "test", **kwargs)
+
+def test_print_job():
+    printer = fast_printer()
+    raster = random_raster(300, seed=0)
+    assert run_job(printer, print_raster(raster))
+    assert printer.jobs == [(300, mxw.PRINTER_WIDTH_BYTES, raster.data)]
+    assert printer.commands[-1] == 0xAD
+    assert printer.errors == []
+
+def test_feed_paper_in_chunks():
+    printer = fast_printer()
+    assert run_job(printer, lambda client, notifications: mxw.run_feed_paper(client, notifications, 600))
+    assert [job.height for job in printer.jobs] == [256, 256, 88]
+    assert all(job.data == bytes(len(job.data)) for job in printer.jobs)
+    assert printer.errors == []
+
+@pytest.mark.parametrize("command_id", [0xA1, 0xA9])
+def test_error_status_fails_job(command_id):
+    printer = fast_printer()
+    printer.fail_next(command_id)
+    assert not run_job(printer, print_raster(random_raster(10, seed=2)))
+    assert printer.jobs == []
+    assert 0xAD not in printer.commands
+
+def test_dropped_aa(monkeypatch):
+    monkeypatch.setattr(mxw, 'SPEED_MIN_TIMEOUT', 0.1)
+    monkeypatch.setattr(mxw, 'SPEED_TIMEOUT_MARGIN', 0.0)
+    mxw.get_speed_model().observe(SIM_ADDRESS, 100, 0.01)
+    mxw.get_speed_model().observe(SIM_ADDRESS, 100, 0.01, kind="feed")
+    printer = fast_printer()
+    printer.drop(0xAA)
+    raster = random_raster(20, seed=3)
+    # A print is still sent in full and counts as done; a feed chunk without AA fails the feed
+    assert run_job(printer, print_raster(raster))
+    assert printer.jobs[-1].data == raster.data
+    assert not run_job(printer, lambda client, notifications: mxw.run_feed_paper(client, notifications, 20))
+
+@pytest.mark.parametrize("window", [1, 4])
+def test_rejected_write_never_prints_out_of_order(window):
+    # Only the 3rd write fails; with a window, later writes of it have already gone through
+    printer = fast_printer()
+    raster = random_raster(40, seed=1)
+    success = run_job(printer, print_raster(raster, window=window), setup=lambda client: printer.reject_writes(3))
+    if window == 1:
+        assert success and printer.jobs[-1].data == raster.data # Resent in order
+    else:
+        assert not success # The data can't be repaired, so the job must not count as printed
+    assert not success or printer.jobs[-1].data == raster.data
+
+def track_data_writes(client, log):
+    """Wraps client.write_gatt_char to append (writes in flight, rejected) for every AE03 write."""
+    write = client.write_gatt_char
+    in_flight = 0
+    async def tracked(char_specifier, data, response=False):
+        nonlocal in_flight
+        if getattr(char_specifier, 'uuid', char_specifier) != mxw.DATA_WRITE_UUID: return await write(char_specifier, data, response)
+        in_flight += 1
+        entry = [in_flight, False]
+        log.append(entry)
+        try: await write(char_specifier, data, response)
+        except Exception: entry[1] = True; raise
+        finally: in_flight -= 1
+    client.write_gatt_char = tracked
+
+def test_window_shrinks_on_congestion():
+    printer = fast_printer()
+    raster = random_raster(200, seed=6)
+    log = []
+    handle_data = printer.handle_data
+    def congest_at_tenth_write(data):
+        if printer._data_writes == 9: printer.congest(0.005)
+        handle_data(data)
+    def setup(client):
+        track_data_writes(client, log)
+        printer.handle_data = congest_at_tenth_write
+    assert run_job(printer, print_raster(raster, window=8), setup=setup)
+    assert printer.jobs[-1].data == raster.data
+    last_rejected = max(i for i, (_, rejected) in enumerate(log) if rejected)
+    assert max(depth for depth, _ in log[:last_rejected]) == 8
+    assert max(depth for depth, _ in log[last_rejected + 1:last_rejected + 40]) < 8 # Backed off
+
+def test_writes_are_pipelined():
+    printer = fast_printer()
+    log = []
+    assert run_job(printer, print_raster(random_raster(100, seed=7), window=4), setup=lambda client: track_data_writes(client, log))
+    assert max(depth for depth, _ in log) == 4
+
+def test_congestion_is_retried():
+    printer = fast_printer()
+    raster = random_raster(100, seed=4)
+    def congest(client): printer.congest(0.01)
+    assert run_job(printer, print_raster(raster), setup=congest)
+    assert printer.jobs[-1].data == raster.data
+
+def test_link_loss_fails_job():
+    printer = fast_printer()
+    handle_data = printer.handle_data
+    def setup(client):
+        def lose_link_on_fifth_write(data):
+            if printer._data_writes == 4: client.simulate_link_loss()
+            handle_data(data)
+        printer.handle_data = lose_link_on_fifth_write
+    def job(client, notifications):
+        async def run():
+            success = await mxw.run_print_job(client, notifications, random_raster(200, seed=5), "test")
+            return success, client.is_connected
+        return run()
+    assert run_job(printer, job, setup=setup) == (False, False)
+    assert printer.jobs == []
+
+def test_speed_model_learns_feeds_and_prints_separately():
+    model = mxw.PrintSpeedModel()
+    for rows in (100, 200, 256):
+        model.observe("P", rows, rows / 2000.0, kind="feed") # Blank paper moves fast
+    model.observe("P", 1000, 10.0)
+    assert model.predict("P", 1000, kind="feed") < 1.0
+    assert model.aa_timeout("P", 4000) >= 40.0 # Tall photo timed from print samples only
+
+def test_failed_stream_text_job_waits_for_band_reader(tmp_path, monkeypatch):
+    path = tmp_path / "log.txt"
+    path.write_text("".join(f"line {i}\n" for i in range(200)))
+    reads = {"started": 0, "finished": 0}
+    iter_text_bands = mxw.iter_text_bands
+    def slow_bands(source):
+        for band in iter_text_bands(source):
+            yield band
+            reads["started"] += 1
+            time.sleep(0.5) # Reading the next band is still running when the job fails
+            reads["finished"] += 1
+    monkeypatch.setattr(mxw, 'iter_text_bands', slow_bands)
+    printer = fast_printer()
+    source = mxw.StreamText(str(path), mxw.DEFAULT_FONT_NAME, 16, 'left')
+    async def job(client, notifications):
+        success = await mxw.run_stream_text_job(client, notifications, source, "log", window=4)
+        return success, dict(reads) # Before asyncio.run's executor shutdown could wait for the reader
+    assert run_job(printer, job, setup=lambda client: printer.reject_writes(3)) == (False, {"started": 1, "finished": 1})
+
+def test_feed_job_is_recorded_as_feed(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(mxw, 'record_job_metrics', recorded.append)
+    args = argparse.Namespace(chunk_size=None, window=mxw.TRANSFER_WINDOW, prefetch=2)
+    # What --feed-after queues when the last job can't take the blank rows itself
+    jobs = [(random_raster(10, seed=8), "label"), (mxw.FeedJob(30), "Feed: 30 lines")]
+    printer = fast_printer()
+    assert run_job(printer, lambda client, notifications: mxw.print_jobs(client, notifications, jobs, args))
+    assert [(m.kind, m.description) for m in recorded] == [("print", "label"), ("feed", "Feed: 30 lines")]
+    assert [job.height for job in printer.jobs] == [10, 30]
@@ -0,0 +1,57 @@
+"""Compares glyph-atlas text rendering and templates with direct FreeType rendering."""
+import os
+import sys
+
+import pytest
+from PIL import ImageChops
+
+pytest.importorskip("matplotlib") # Fonts are resolved by name through matplotlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MXW01print as mxw
+
+TEXT = "Order #1042\nLatte grande x2 ........ 9.00\nThank you for your visit, see you again soon! Averylongwordthatcannotfitonasinglelineofpaperatall"
+WIDTH = mxw.PRINTER_WIDTH_PIXELS
+
+def differing_pixels(a, b):
+    assert a.size == b.size
+    return ImageChops.logical_xor(a, b).histogram()[255]
+
+@pytest.fixture(scope="module")
+def mono_font():
+    # Monospaced, so every glyph advance is a whole pixel and the atlas must match exactly
+    return mxw.load_font("DejaVu Sans Mono", 18)
+
+@pytest.mark.parametrize("alignment", ["left", "center", "right"])
+def test_atlas_matches_direct_rendering(mono_font, alignment):
+    atlas = mxw.GlyphAtlas(mono_font)
+    lines = mxw.wrap_text(TEXT, mono_font, WIDTH, atlas)
+    assert len(lines) > len(TEXT.split('\n')) # Some lines were wrapped
+    assert lines == mxw.wrap_text(TEXT, mono_font, WIDTH)
+    assert differing_pixels(mxw.render_text_lines(lines, mono_font, WIDTH, alignment, atlas), mxw.render_text_lines(lines, mono_font, WIDTH, alignment)) == 0
+
+@pytest.mark.parametrize("alignment", ["left", "center", "right"])
+def test_atlas_layout_matches_for_proportional_font(alignment):
+    # Glyphs are placed at whole pixels without kerning, so only the layout has to match
+    font = mxw.load_font("DejaVu Sans", 18)
+    atlas = mxw.GlyphAtlas(font)
+    lines = mxw.wrap_text(TEXT, font, WIDTH, atlas)
+    assert [line for line, _ in lines] == [line for line, _ in mxw.wrap_text(TEXT, font, WIDTH)]
+    with_atlas = mxw.render_text_lines(lines, font, WIDTH, alignment, atlas)
+    direct = mxw.render_text_lines(lines, font, WIDTH, alignment)
+    assert with_atlas.size == direct.size
+    atlas_box, direct_box = ImageChops.invert(with_atlas.convert('L')).getbbox(), ImageChops.invert(direct.convert('L')).getbbox()
+    assert all(abs(a - b) <= 2 for a, b in zip(atlas_box, direct_box))
+
+@pytest.mark.parametrize("alignment", ["left", "center", "right"])
+def test_template_matches_rendered_text(mono_font, alignment):
+    template = mxw.TextTemplate("RECEIPT\n{item} x{qty}\n{note}\nTotal: {total}\n-- thanks --", mono_font, WIDTH, alignment)
+    fields = {"item": "Latte grande", "qty": 2, "note": "Extra hot with oat milk and a little cinnamon on top please", "total": "9.00"}
+    text = "RECEIPT\nLatte grande x2\nExtra hot with oat milk and a little cinnamon on top please\nTotal: 9.00\n-- thanks --"
+    assert template.fields == {"item", "qty", "note", "total"}
+    assert differing_pixels(template.render(fields), mxw.create_text_bitmap(text, mono_font, WIDTH, alignment)) == 0
+
+def test_template_errors(mono_font):
+    with pytest.raises(ValueError, match="line 2"): mxw.TextTemplate("ok\nbad }", mono_font)
+    template = mxw.TextTemplate("{name}", mono_font)
+    with pytest.raises(ValueError, match="Missing template field"): template.render({})
@@ -0,0 +1,83 @@
+"""Checks blank-row detection and trimming of packed rasters against a row-by-row reference."""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import MXW01print as mxw
+
+ROW = mxw.PRINTER_WIDTH_BYTES
+BLANK = bytes(ROW)
+INK = b'\x01' + bytes(ROW - 1)
+
+def raster(rows):
+    """A PackedRaster from a string of rows: '.' blank, '#' with a dot."""
+    return mxw.PackedRaster(b"".join(BLANK if r == '.' else INK for r in rows), len(rows))
+
+def rows_of(packed):
+    return "".join('.' if packed.data[i * ROW:(i + 1) * ROW] == BLANK else '#' for i in range(packed.height))
+
+def reference_blank_runs(rows, min_rows=1):
+    runs, start = [], None
+    for i, r in enumerate(rows + '#'):
+        if r == '.' and start is None: start = i
+        elif r != '.' and start is not None:
+            if i - start >= min_rows: runs.append((start, i - start))
+            start = None
+    return runs
+
+@pytest.mark.parametrize("rows", ["", "#", ".", "....", "#..#", "..##..", ".#.#.#.", "###...###"])
+@pytest.mark.parametrize("min_rows", [1, 2, 3])
+def test_find_blank_runs_matches_reference(rows, min_rows):
+    assert mxw.find_blank_runs(raster(rows).data, min_rows=min_rows) == reference_blank_runs(rows, min_rows)
+
+def test_find_blank_runs_ignores_zero_bytes_across_rows():
+    # A row ending in zeros followed by a row starting with zeros is not a blank row
+    half = b'\x01' + bytes(ROW - 1)
+    data = half + bytes(ROW - 1) + b'\x01'
+    assert mxw.find_blank_runs(data) == []
+
+@pytest.mark.parametrize("length", [1, 2, 3])
+def test_find_blank_runs_at_and_below_min_rows(length):
+    rows = "#" + "." * length + "#"
+    assert mxw.find_blank_runs(raster(rows).data, min_rows=2) == ([(1, length)] if length >= 2 else [])
+
+@pytest.mark.parametrize("margin, expected", [(None, "......"), (0, "."), (2, ".."), (10, "......")])
+def test_trim_all_blank_raster_keeps_margin(margin, expected):
+    trimmed, removed = mxw.trim_raster(raster("......"), margin=margin)
+    assert rows_of(trimmed) == expected
+    assert removed == 6 - len(expected)
+
+@pytest.mark.parametrize("rows, margin, expected", [
+    ("....##", 1, ".##"), # Top edge
+    ("##....", 1, "##."), # Bottom edge
+    ("...#...", 0, "#"),
+    ("..#..", 2, "..#.."), # Runs exactly at the margin stay
+    (".#.", 5, ".#."),
+])
+def test_trim_edges(rows, margin, expected):
+    trimmed, removed = mxw.trim_raster(raster(rows), margin=margin)
+    assert rows_of(trimmed) == expected
+    assert removed == len(rows) - len(expected)
+
+@pytest.mark.parametrize("rows, max_gap, expected", [
+    ("#....#", 2, "#..#"),
+    ("#..#", 2, "#..#"), # At the limit
+    ("#.#", 2, "#.#"), # Below the limit
+    ("#...#...#", 0, "###"),
+    ("..#....#..", 1, "..#.#.."), # Edges are left alone without a margin
+])
+def test_collapse_gaps(rows, max_gap, expected):
+    trimmed, removed = mxw.trim_raster(raster(rows), max_gap=max_gap)
+    assert rows_of(trimmed) == expected
+    assert removed == len(rows) - len(expected)
+
+def test_trim_keeps_printed_rows():
+    rng = random.Random(11)
+    data = bytes(rng.randrange(1, 256) for _ in range(ROW * 4))
+    packed = mxw.PackedRaster(BLANK * 3 + data + BLANK * 5 + data + BLANK * 2, 18)
+    trimmed, removed = mxw.trim_raster(packed, margin=1, max_gap=2)
+    assert trimmed == (BLANK + data + BLANK * 2 + data + BLANK, 12)
+    assert removed == 6